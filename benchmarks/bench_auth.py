@@ -0,0 +1,55 @@
+"""
+per-request cost of turning a bearer token into its subject:
+
+    verify   jwt.decode with signature and exp checks, what every request did
+    cached   decode_token hit in token_claims_cache: sha256 of the token and a
+             dict lookup
+    revoked  revocation_list.is_revoked for a token that is not revoked, the
+             check get_current_user adds to every request
+
+run from the repository root with SECRET_KEY and ALGORITHM set:
+
+    python -m benchmarks.bench_auth
+"""
+
+import timeit
+
+import jwt
+
+from foodapp.security.user_security import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    get_subject_token_type,
+    get_token_claims,
+    revocation_list,
+    token_claims_cache,
+)
+
+ROUNDS = 20000
+
+
+def main() -> None:
+    token = create_access_token("bench@example.com")
+
+    def verify():
+        jwt.decode(jwt=token, key=SECRET_KEY, algorithms=[ALGORITHM])
+
+    def cached():
+        get_subject_token_type(token, "access")
+
+    token_claims_cache.clear()
+    cached()
+    claims = get_token_claims(token, "access")
+
+    def revoked():
+        revocation_list.is_revoked(claims)
+
+    for name, func in (("verify", verify), ("cached", cached), ("revoked", revoked)):
+        seconds = min(timeit.repeat(func, number=ROUNDS, repeat=5)) / ROUNDS
+        print(f"{name:>8}: {seconds * 1e6:8.2f} us/request")
+    print(f"token cache: {token_claims_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+compare the ways a 50-post /posts page can be turned into response bytes:
+
+    fastapi   what the route did before: return raw rows and let FastAPI validate
+              them against response_model, run jsonable_encoder and json.dumps
+    pydantic  validate each row into UserPostWithLike once, dump with pydantic-core
+    fast      FAST_SERIALIZATION: copy the model's fields out of the row, orjson
+
+run from the repository root:
+
+    python -m benchmarks.bench_serialization
+"""
+
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from foodapp.models.post import UserPostWithLike
+from foodapp.utils.serialization import rows_to_json
+
+PAGE_SIZE = 50
+ROUNDS = 2000
+
+
+class Row(dict):
+    """
+    stand-in for a databases Record: mapping and attribute access
+    """
+
+    __getattr__ = dict.__getitem__
+
+
+rows = [
+    Row(
+        id=post_id,
+        body=f"half price burgers at place number {post_id} until friday " * 3,
+        user_id=post_id % 17,
+        image_url=None,
+        like_count=post_id * 3,
+        comment_count=post_id,
+        version=4,
+        hot_score=12345.678,
+        likes=post_id * 3,
+    )
+    for post_id in range(PAGE_SIZE)
+]
+adapter = TypeAdapter(list[UserPostWithLike])
+
+
+def fastapi_path() -> bytes:
+    validated = adapter.validate_python(rows, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def pydantic_path() -> bytes:
+    return adapter.dump_json([UserPostWithLike.model_validate(row) for row in rows])
+
+
+def fast_path() -> bytes:
+    return rows_to_json(rows, UserPostWithLike)
+
+
+def main() -> None:
+    assert json.loads(fast_path()) == json.loads(fastapi_path())
+    baseline = None
+    for name, path in [
+        ("fastapi", fastapi_path),
+        ("pydantic", pydantic_path),
+        ("fast", fast_path),
+    ]:
+        seconds = min(timeit.repeat(path, number=ROUNDS, repeat=5)) / ROUNDS
+        baseline = baseline or seconds
+        print(
+            f"{name:>8}: {seconds * 1e6:8.1f} us per {PAGE_SIZE}-post page"
+            f"  ({baseline / seconds:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
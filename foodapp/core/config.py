@@ -18,6 +18,40 @@ class GlobalConfig(BaseConfig):
     CORS_ORIGINS: Optional[str] = None
     FRONTEND_BASE_URL: Optional[str] = None
     FRONTEND_BASE_URLS: Optional[str] = None
+    POST_CACHE_MAX_ENTRIES: int = 1024
+    POST_CACHE_TTL_SECONDS: float = 30.0
+    FAST_SERIALIZATION: bool = True
+    LIKE_WRITE_BEHIND: bool = False
+    LIKE_FLUSH_SIZE: int = 500
+    LIKE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LIKE_FLUSH_MAX_ATTEMPTS: int = 5
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_PROCESSES: bool = False
+    ARGON2_TIME_COST: Optional[int] = None
+    ARGON2_MEMORY_COST_KIB: Optional[int] = None
+    ARGON2_PARALLELISM: Optional[int] = None
+    ARGON2_REHASH_TOLERANCE: float = 0.5
+    ARGON2_TARGET_MS: float = 100.0
+    ARGON2_MAX_MEMORY_KIB: int = 65536
+    ARGON2_MIN_MEMORY_KIB: int = 19456
+    USER_CACHE_MAX_ENTRIES: int = 4096
+    USER_CACHE_TTL_SECONDS: float = 10.0
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    TOKEN_CACHE_MAX_TTL_SECONDS: float = 1800.0
+    LOGIN_IP_RATE_PER_MINUTE: float = 60.0
+    LOGIN_IP_BURST: int = 20
+    LOGIN_EMAIL_RATE_PER_MINUTE: float = 10.0
+    LOGIN_EMAIL_BURST: int = 10
+    LOGIN_MAX_CONCURRENT: int = 16
+    TRUSTED_PROXIES: Optional[str] = None
+    OPERATOR_EMAILS: Optional[str] = None
+    TOKEN_SWEEP_ENABLED: bool = True
+    TOKEN_SWEEP_INTERVAL_SECONDS: float = 300.0
+    TOKEN_SWEEP_BATCH_SIZE: int = 500
+    TOKEN_SWEEP_BATCH_PAUSE_SECONDS: float = 0.1
+    REVOCATION_REFRESH_SECONDS: float = 5.0
+    REVOCATION_REBUILD_SECONDS: float = 600.0
 
 
 class DevConfig(GlobalConfig):
@@ -38,6 +72,11 @@ class SecurityKeys(BaseConfig):
     ALGORITHM: Optional[str] = None
     REFRESH_TOKEN_SECRET_KEY: Optional[str] = None
     REFRESH_TOKEN_ALGORITHM: Optional[str] = None
+    TOKEN_DIGEST_KEY: Optional[str] = None
+    JWT_KEYS_DIR: Optional[str] = None
+    JWT_ACTIVE_KID: Optional[str] = None
+    JWT_KEY_OVERLAP_SECONDS: float = 3600.0
+    JWT_ACCEPT_HMAC_ACCESS_TOKENS: bool = True
     SENTRY_DSN:Optional[str]=None
     SENTRY_SEND_DEFAULT_PII: bool = False
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -0,0 +1,132 @@
+"""
+one-off step for databases created before posts carried like_count/comment_count
+and hot_score, and before likes were unique per user and post. adds the missing
+columns and indexes, drops repeated likes, recomputes both counters from the
+likes and comments tables and then the hot ranking from the counters.
+applied as migration 2 by foodapp.db.migrations, and safe to run again by hand:
+
+    python -m foodapp.db.backfill
+"""
+
+import logging
+
+import sqlalchemy
+
+from foodapp.db.database import comment_table, engine, like_table, post_table
+from foodapp.services.ranking import HOT_EPOCH, hot_score
+
+logger = logging.getLogger(__name__)
+
+
+# types are compiled for the dialect so a migrated table matches a fresh one
+MISSING_POST_COLUMNS = {
+    "like_count": "INTEGER NOT NULL DEFAULT 0",
+    "comment_count": "INTEGER NOT NULL DEFAULT 0",
+    "version": "INTEGER NOT NULL DEFAULT 1",
+    "created_at": sqlalchemy.DateTime(timezone=True),
+    "hot_score": "FLOAT NOT NULL DEFAULT 0",
+}
+
+
+def add_missing_post_columns(connection) -> None:
+    existing = {
+        column["name"] for column in sqlalchemy.inspect(connection).get_columns("posts")
+    }
+    for name, ddl in MISSING_POST_COLUMNS.items():
+        if name not in existing:
+            logger.info(f"adding posts.{name}")
+            if not isinstance(ddl, str):
+                ddl = ddl.compile(dialect=connection.dialect)
+            connection.execute(
+                sqlalchemy.text(f"ALTER TABLE posts ADD COLUMN {name} {ddl}")
+            )
+    for index in (*post_table.indexes, *comment_table.indexes):
+        index.create(connection, checkfirst=True)
+
+
+def remove_duplicate_likes(connection) -> int:
+    """
+    keep the first like of every (user, post) pair so the unique index can be built
+    """
+    first_likes = (
+        sqlalchemy.select(sqlalchemy.func.min(like_table.c.id))
+        .group_by(like_table.c.user_id, like_table.c.post_id)
+        .scalar_subquery()
+    )
+    result = connection.execute(
+        like_table.delete().where(like_table.c.id.not_in(first_likes))
+    )
+    for index in like_table.indexes:
+        index.create(connection, checkfirst=True)
+    return result.rowcount
+
+
+def backfill_post_counters(connection) -> int:
+    like_count = (
+        sqlalchemy.select(sqlalchemy.func.count(like_table.c.id))
+        .where(like_table.c.post_id == post_table.c.id)
+        .scalar_subquery()
+    )
+    comment_count = (
+        sqlalchemy.select(sqlalchemy.func.count(comment_table.c.id))
+        .where(comment_table.c.post_id == post_table.c.id)
+        .scalar_subquery()
+    )
+    result = connection.execute(
+        post_table.update().values(like_count=like_count, comment_count=comment_count)
+    )
+    return result.rowcount
+
+
+def backfill_created_at(connection) -> int:
+    """
+    posts created before created_at existed are dated HOT_EPOCH, the time their
+    hot score is computed from
+    """
+    result = connection.execute(
+        post_table.update()
+        .where(post_table.c.created_at.is_(None))
+        .values(created_at=HOT_EPOCH)
+    )
+    return result.rowcount
+
+
+def backfill_hot_scores(connection) -> int:
+    """
+    posts created before created_at existed are ranked as if posted at HOT_EPOCH,
+    which keeps them below anything new
+    """
+    posts = connection.execute(
+        sqlalchemy.select(
+            post_table.c.id,
+            post_table.c.like_count,
+            post_table.c.comment_count,
+            post_table.c.created_at,
+        )
+    ).all()
+    for post in posts:
+        score = hot_score(
+            post.like_count, post.comment_count, post.created_at or HOT_EPOCH
+        )
+        connection.execute(
+            post_table.update()
+            .where(post_table.c.id == post.id)
+            .values(hot_score=score)
+        )
+    return len(posts)
+
+
+def run() -> None:
+    with engine.begin() as connection:
+        add_missing_post_columns(connection)
+        removed = remove_duplicate_likes(connection)
+        updated = backfill_post_counters(connection)
+        backfill_created_at(connection)
+        backfill_hot_scores(connection)
+    logger.info(f"removed {removed} repeated likes")
+    logger.info(f"back-filled counters and hot scores on {updated} posts")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
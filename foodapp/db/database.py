@@ -3,6 +3,10 @@ import sqlalchemy
 from foodapp.core.config import config
 
 DATABASE_URL = config.DATABASE_URL
+if "postgres" in DATABASE_URL:
+    from sqlalchemy.dialects.postgresql import insert as dialect_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as dialect_insert
 metadata = sqlalchemy.MetaData()
 user_table = sqlalchemy.Table(
     "users",
@@ -11,6 +15,10 @@ user_table = sqlalchemy.Table(
     sqlalchemy.Column("email", sqlalchemy.String, nullable=False, unique=True),
     sqlalchemy.Column("password", sqlalchemy.String, nullable=False),
     sqlalchemy.Column("confirmed", sqlalchemy.Boolean, default=False),
+    # bumped whenever claims in outstanding access tokens stop being true
+    sqlalchemy.Column(
+        "token_version", sqlalchemy.Integer, nullable=False, server_default="1"
+    ),
 )
 
 refreshtoken_table = sqlalchemy.Table(
@@ -23,6 +31,11 @@ refreshtoken_table = sqlalchemy.Table(
     ),
     sqlalchemy.Column("revoked", sqlalchemy.Boolean, default=False),
     sqlalchemy.Column("hashed_token", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True)),
+    sqlalchemy.Index("ix_refreshtokens_jti", "jti"),
+    sqlalchemy.Index("ix_refreshtokens_hashed_token", "hashed_token"),
+    sqlalchemy.Index("ix_refreshtokens_user_email", "user_email"),
+    sqlalchemy.Index("ix_refreshtokens_expires_at", "expires_at"),
 )
 
 password_reset_table = sqlalchemy.Table(
@@ -34,6 +47,10 @@ password_reset_table = sqlalchemy.Table(
         "user_email", sqlalchemy.ForeignKey("users.email"), nullable=False
     ),
     sqlalchemy.Column("hashed_token", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True)),
+    sqlalchemy.Index("ix_password_reset_tokens_jti", "jti"),
+    sqlalchemy.Index("ix_password_reset_tokens_hashed_token", "hashed_token"),
+    sqlalchemy.Index("ix_password_reset_tokens_expires_at", "expires_at"),
 )
 
 post_table = sqlalchemy.Table(
@@ -43,6 +60,30 @@ post_table = sqlalchemy.Table(
     sqlalchemy.Column("body", sqlalchemy.String),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
     sqlalchemy.Column("image_url", sqlalchemy.String),
+    # denormalized counters, kept in step with likes/comments inside the write transaction
+    sqlalchemy.Column(
+        "like_count", sqlalchemy.Integer, nullable=False, server_default="0"
+    ),
+    sqlalchemy.Column(
+        "comment_count", sqlalchemy.Integer, nullable=False, server_default="0"
+    ),
+    # bumped on every change to the post or what is shown with it, feeds the ETags
+    sqlalchemy.Column(
+        "version", sqlalchemy.Integer, nullable=False, server_default="1"
+    ),
+    sqlalchemy.Column(
+        "created_at",
+        sqlalchemy.DateTime(timezone=True),
+        server_default=sqlalchemy.func.now(),
+    ),
+    # precomputed time-decayed rank, see foodapp.services.ranking
+    sqlalchemy.Column(
+        "hot_score", sqlalchemy.Float, nullable=False, server_default="0"
+    ),
+    sqlalchemy.Index("ix_posts_user_id_id", "user_id", "id"),
+    sqlalchemy.Index("ix_posts_like_count_id", "like_count", "id"),
+    sqlalchemy.Index("ix_posts_hot_score_id", "hot_score", "id"),
+    sqlalchemy.Index("ix_posts_comment_count_id", "comment_count", "id"),
 )
 
 comment_table = sqlalchemy.Table(
@@ -54,6 +95,7 @@ comment_table = sqlalchemy.Table(
         "post_id", sqlalchemy.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
     ),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+    sqlalchemy.Index("ix_comments_post_id_id", "post_id", "id"),
 )
 
 
@@ -63,6 +105,9 @@ like_table = sqlalchemy.Table(
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
     sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), nullable=False),
+    # one like per user per post, see insert_or_ignore
+    sqlalchemy.Index("uq_likes_user_id_post_id", "user_id", "post_id", unique=True),
+    sqlalchemy.Index("ix_likes_post_id", "post_id"),
 )
 
 connect_args = {"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
@@ -77,10 +122,35 @@ database = databases.Database(
 )
 
 
+# revoked access tokens, by "jti:<jti>", and revoke-all cutoffs, by
+# "user:<email>" (tokens of that user issued at or before revoked_at)
+revoked_token_table = sqlalchemy.Table(
+    "revoked_tokens",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("key", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("revoked_at", sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+    sqlalchemy.Index("ix_revoked_tokens_expires_at", "expires_at"),
+)
+
+
+def insert_or_ignore(table: sqlalchemy.Table, *conflict_columns: str):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for the configured backend; add
+    .returning(...) to tell whether a row was actually written
+    """
+    return dialect_insert(table).on_conflict_do_nothing(
+        index_elements=list(conflict_columns)
+    )
+
+
 def db_connection():
     return database
 
 
 def init_db() -> None:
-    metadata.create_all(engine)
- 
\ No newline at end of file
+    # imported here because the migration steps import the tables above
+    from foodapp.db.migrations import migrate
+
+    migrate(engine)
@@ -0,0 +1,270 @@
+"""
+versioned schema migrations.
+
+every boot runs migrate(), which applies the steps in MIGRATIONS that the
+schema_migrations table hasn't recorded yet, each in its own transaction.
+version 1 is the baseline: it creates whatever tables are missing from the
+current metadata, so a fresh database gets the full schema (indexes included)
+in one go and the later steps only have to be idempotent for it. databases
+that predate a step are brought forward in place by that step.
+
+to evolve the schema, declare the change in foodapp.db.database and append a
+step here that applies it to an existing database; never edit a released step.
+
+    python -m foodapp.db.migrations
+"""
+
+import datetime
+import logging
+from collections.abc import Callable
+from typing import NamedTuple
+
+import sqlalchemy
+
+from foodapp.db import backfill
+from foodapp.db.database import (
+    comment_table,
+    engine,
+    like_table,
+    metadata,
+    password_reset_table,
+    post_table,
+    refreshtoken_table,
+    revoked_token_table,
+)
+
+logger = logging.getLogger(__name__)
+
+# arbitrary key for pg_advisory_xact_lock so concurrent workers migrate one at a time
+MIGRATION_LOCK_KEY = 7_305_118
+
+migration_table = sqlalchemy.Table(
+    "schema_migrations",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("version", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("name", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("applied_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable
+
+
+def create_indexes(connection, *names: str) -> None:
+    tables = (
+        post_table,
+        comment_table,
+        like_table,
+        refreshtoken_table,
+        password_reset_table,
+    )
+    indexes = {index.name: index for table in tables for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+def baseline(connection) -> None:
+    metadata.create_all(connection)
+
+
+def post_counters(connection) -> None:
+    backfill.add_missing_post_columns(connection)
+    backfill.remove_duplicate_likes(connection)
+    backfill.backfill_post_counters(connection)
+    backfill.backfill_hot_scores(connection)
+
+
+def hot_path_indexes(connection) -> None:
+    create_indexes(
+        connection,
+        "ix_comments_post_id_id",
+        "ix_likes_post_id",
+        "ix_refreshtokens_jti",
+        "ix_refreshtokens_user_email",
+        "ix_password_reset_tokens_jti",
+    )
+    # superseded by ix_posts_user_id_id in migration 5, so no longer in the metadata
+    connection.execute(
+        sqlalchemy.text(
+            "CREATE INDEX IF NOT EXISTS ix_posts_user_id ON posts (user_id)"
+        )
+    )
+
+
+SQLITE_POST_SEARCH = [
+    (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts "
+        "USING fts5(body, content='posts', content_rowid='id')"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+        "INSERT INTO posts_fts(rowid, body) VALUES (new.id, new.body); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, body) VALUES ('delete', old.id, old.body); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF body ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+        "INSERT INTO posts_fts(rowid, body) VALUES (new.id, new.body); END"
+    ),
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_POST_SEARCH = [
+    (
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(body, ''))) STORED"
+    ),
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)",
+]
+
+
+def post_search(connection) -> None:
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_POST_SEARCH
+    else:
+        statements = SQLITE_POST_SEARCH
+    for statement in statements:
+        connection.execute(sqlalchemy.text(statement))
+
+
+def posts_by_author_index(connection) -> None:
+    connection.execute(sqlalchemy.text("DROP INDEX IF EXISTS ix_posts_user_id"))
+    create_indexes(connection, "ix_posts_user_id_id")
+
+
+def token_digest_indexes(connection) -> None:
+    # existing argon2 rows stay valid; they are matched by jti and replaced by
+    # a digest the next time the token is rotated or used
+    create_indexes(
+        connection,
+        "ix_refreshtokens_hashed_token",
+        "ix_password_reset_tokens_hashed_token",
+    )
+
+
+def user_token_version(connection) -> None:
+    existing = {
+        column["name"] for column in sqlalchemy.inspect(connection).get_columns("users")
+    }
+    if "token_version" not in existing:
+        connection.execute(
+            sqlalchemy.text(
+                "ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 1"
+            )
+        )
+
+
+# lifetimes the tokens were issued with when this step was written; rows that
+# predate expires_at are given the longest time their token could still be valid
+LEGACY_TOKEN_LIFETIMES = (
+    (refreshtoken_table, datetime.timedelta(days=30)),
+    (password_reset_table, datetime.timedelta(minutes=30)),
+)
+
+
+def token_expiry(connection) -> None:
+    now = datetime.datetime.now(tz=datetime.UTC)
+    column_type = sqlalchemy.DateTime(timezone=True).compile(dialect=connection.dialect)
+    for table, lifetime in LEGACY_TOKEN_LIFETIMES:
+        existing = {
+            column["name"]
+            for column in sqlalchemy.inspect(connection).get_columns(table.name)
+        }
+        if "expires_at" not in existing:
+            connection.execute(
+                sqlalchemy.text(
+                    f"ALTER TABLE {table.name} ADD COLUMN expires_at {column_type}"
+                )
+            )
+        connection.execute(
+            table.update()
+            .where(table.c.expires_at.is_(None))
+            .values(expires_at=now + lifetime)
+        )
+    create_indexes(
+        connection, "ix_refreshtokens_expires_at", "ix_password_reset_tokens_expires_at"
+    )
+
+
+def revoked_tokens(connection) -> None:
+    revoked_token_table.create(connection, checkfirst=True)
+
+
+def post_created_at(connection) -> None:
+    # migration 2 added created_at as a bare TIMESTAMP and left it empty
+    column_types = {
+        column["name"]: column["type"]
+        for column in sqlalchemy.inspect(connection).get_columns("posts")
+    }
+    if (
+        connection.dialect.name == "postgresql"
+        and not column_types["created_at"].timezone
+    ):
+        connection.execute(
+            sqlalchemy.text(
+                "ALTER TABLE posts ALTER COLUMN created_at TYPE TIMESTAMP WITH TIME ZONE "
+                "USING created_at AT TIME ZONE 'UTC'"
+            )
+        )
+    backfill.backfill_created_at(connection)
+
+
+MIGRATIONS = [
+    Migration(1, "baseline schema", baseline),
+    Migration(2, "post counters, hot score and unique likes", post_counters),
+    Migration(3, "hot path secondary indexes", hot_path_indexes),
+    Migration(4, "post full-text search", post_search),
+    Migration(5, "composite (user_id, id) index on posts", posts_by_author_index),
+    Migration(6, "lookup indexes for token digests", token_digest_indexes),
+    Migration(7, "access token version per user", user_token_version),
+    Migration(8, "expiry on refresh and reset tokens", token_expiry),
+    Migration(9, "revoked access tokens", revoked_tokens),
+    Migration(10, "created_at on posts that predate it", post_created_at),
+]
+
+
+def current_version(connection) -> int:
+    migration_table.create(connection, checkfirst=True)
+    version = connection.execute(
+        sqlalchemy.select(sqlalchemy.func.max(migration_table.c.version))
+    ).scalar()
+    return version or 0
+
+
+def migrate(bind=engine) -> int:
+    """
+    apply pending migrations and return the schema version the database is at
+    """
+    version = 0
+    for migration in MIGRATIONS:
+        with bind.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(
+                    sqlalchemy.text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": MIGRATION_LOCK_KEY},
+                )
+            version = current_version(connection)
+            if migration.version <= version:
+                continue
+            logger.info(f"applying migration {migration.version}: {migration.name}")
+            migration.apply(connection)
+            connection.execute(
+                migration_table.insert().values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied_at=datetime.datetime.now(tz=datetime.UTC),
+                )
+            )
+            version = migration.version
+    return version
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"schema at version {migrate()}")
@@ -5,7 +5,9 @@ from asgi_correlation_id import CorrelationIdMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exception_handlers import http_exception_handler
 from contextlib import asynccontextmanager
-from foodapp.routers.post import router as post_router
+from foodapp.routers.post import router as post_router, like_buffer
+from foodapp.routers.batch import router as batch_router
+from foodapp.routers.export import router as export_router
 from foodapp.routers.fileuploads import router as upload_router
 from foodapp.routers.upload import router as b2_upload_router
 from foodapp.routers.videochats import router as videochat_router
@@ -13,6 +15,13 @@ from foodapp.routers.user import router as user_router
 from foodapp.routers.concurrency_async import test_router
 from foodapp.db.database import db_connection, init_db
 from foodapp.routers.food_vision import router as food_vision_router
+from foodapp.routers.metrics import router as metrics_router
+from foodapp.security.user_security import (
+    configure_password_hasher,
+    hash_executor,
+    revocation_list,
+    token_sweeper,
+)
 import sentry_sdk
 from foodapp.core.config import SecurityKeys, config
 
@@ -46,8 +55,30 @@ async def lifespan(app: FastAPI):
         logging.shutdown()
         raise
 
+    # revoked tokens must be known before the first request is served
+    await revocation_list.load()
+    revocation_list.start()
+
+    configure_password_hasher()
+
+    if config.LIKE_WRITE_BEHIND:
+        like_buffer.start()
+
+    if config.TOKEN_SWEEP_ENABLED:
+        token_sweeper.start()
+
     yield
 
+    try:
+        logger.info("flushing buffered likes...")
+        await like_buffer.stop()
+    except Exception:
+        logger.exception("unable to flush buffered likes")
+
+    await token_sweeper.stop()
+    await revocation_list.stop()
+    hash_executor.shutdown()
+
     try:
         logger.info("🔌 Disconnecting database...")
         await database.disconnect()
@@ -78,6 +109,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"] ,
     allow_headers=["*"] ,
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Mount static files
@@ -87,12 +119,15 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 # 4️⃣ Routers
 app.include_router(post_router)
+app.include_router(batch_router)
+app.include_router(export_router)
 app.include_router(upload_router)
 app.include_router(videochat_router)
 app.include_router(user_router)
 app.include_router(test_router)
 app.include_router(b2_upload_router)
 app.include_router(food_vision_router)
+app.include_router(metrics_router)
 
 
 # 5️⃣ Exception Handlers
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from pydantic import ConfigDict
-from typing import Optional
+from pydantic import ConfigDict, Field
+from typing import Annotated, Literal, Optional, Union
 
 
 class UserPostIn(BaseModel):
@@ -19,6 +19,12 @@ class UserPostWithLike(UserPost):
     model_config = ConfigDict(from_attributes=True)
 
 
+class PostLookup(BaseModel):
+    id: int
+    found: bool
+    post: Optional[UserPostWithLike] = None
+
+
 class CommentIn(BaseModel):
     body: str
     post_id: int
@@ -38,20 +44,62 @@ class PostLikeIn(BaseModel):
     post_id: int
 
 
-class PostLike(PostLikeIn):
+class PostLikeCount(PostLikeIn):
     user_id: int
+    likes: int
+
+
+class PostLike(PostLikeCount):
     id: int
 
-    """
-    user_post has:-
-        body: string
-        post_id: int,unique for every single post
-    user_comment has:-
-        body:string
-        post_id:int match with anyone of already posted on user_post,relation
-        comment_id:int,unique for every single comment
 
-    user_post_with_comments:-
-        here we gonna to filter the post and then retrieve comments on this post: retrieve all comment where post_id is given post id
+class PostLikeQueued(PostLikeIn):
+    user_id: int
+    status: Literal["queued"]
+
+
+class BatchPostOp(UserPostIn):
+    op: Literal["post"]
+
+
+class BatchCommentOp(BaseModel):
+    op: Literal["comment"]
+    body: str
+    post_id: int
+
+
+class BatchLikeOp(PostLikeIn):
+    op: Literal["like"]
+
+
+BatchOperation = Annotated[
+    Union[BatchPostOp, BatchCommentOp, BatchLikeOp], Field(discriminator="op")
+]
+
+
+class BatchWriteIn(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=500)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    status: Literal["created", "rejected"]
+    # id of the post, comment or like row the operation wrote
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+"""
+user_post has:-
+    body: string
+    post_id: int,unique for every single post
+user_comment has:-
+    body:string
+    post_id:int match with anyone of already posted on user_post,relation
+    comment_id:int,unique for every single comment
+
+user_post_with_comments:-
+    here we gonna to filter the post and then retrieve comments on this post: retrieve all comment where post_id is given post id
 
-    """
+"""
@@ -6,6 +6,11 @@ class User(BaseModel):
     email: str
 
 
+class UserIdentity(User):
+    confirmed: bool = False
+    token_version: int = 1
+
+
 class UserIn(User):
     password: str
 
@@ -0,0 +1,183 @@
+import datetime
+import logging
+from collections import Counter
+from typing import Annotated
+
+import sqlalchemy
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from foodapp.db.database import (
+    comment_table,
+    db_connection,
+    insert_or_ignore,
+    like_table,
+    post_table,
+)
+from foodapp.models.post import (
+    BatchCommentOp,
+    BatchItemResult,
+    BatchPostOp,
+    BatchWriteIn,
+)
+from foodapp.models.user import User
+from foodapp.routers.post import (
+    PostSorting,
+    bump_post_version,
+    per_post_increment,
+    refresh_hot_scores,
+    response_cache,
+)
+from foodapp.security.user_security import get_current_user
+from foodapp.services.ranking import hot_score
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+database = db_connection()
+
+
+def assign_ids(results: list[BatchItemResult], rows) -> None:
+    """
+    RETURNING doesn't promise row order, but a multi-row INSERT hands out ids in
+    VALUES order, so the sorted ids line up with the operations
+    """
+    for result, row_id in zip(results, sorted(row.id for row in rows)):
+        result.id = row_id
+
+
+@router.post("/batch", response_model=list[BatchItemResult])
+async def batch_write(
+    batch: BatchWriteIn, current_user: Annotated[User, Depends(get_current_user)]
+):
+    """
+    apply a burst of offline posts, comments and likes for one user in one transaction.
+    every operation gets a result at its index; operations on posts that don't exist
+    are rejected without failing the rest of the batch
+    """
+    operations = batch.operations
+    logger.info(f"applying batch of {len(operations)} operations")
+    if not current_user.confirmed and any(
+        isinstance(op, BatchPostOp) for op in operations
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="your email is not confirmed, please check your spam folder and confirm your email.",
+        )
+
+    referenced = {op.post_id for op in operations if not isinstance(op, BatchPostOp)}
+    existing = set()
+    if referenced:
+        rows = await database.fetch_all(
+            sqlalchemy.select(post_table.c.id).where(post_table.c.id.in_(referenced))
+        )
+        existing = {row.id for row in rows}
+
+    results = []
+    posts, comments, likes = [], [], []
+    # results waiting for the id of the row they wrote
+    post_results, comment_results, like_results = [], [], {}
+    created_at = datetime.datetime.now(tz=datetime.UTC)
+    for index, op in enumerate(operations):
+        result = BatchItemResult(index=index, op=op.op, status="created")
+        if isinstance(op, BatchPostOp):
+            post_results.append(result)
+            posts.append(
+                {
+                    "body": op.body,
+                    "user_id": current_user.id,
+                    "created_at": created_at,
+                    "hot_score": hot_score(0, 0, created_at),
+                }
+            )
+        elif op.post_id not in existing:
+            results.append(
+                BatchItemResult(
+                    index=index, op=op.op, status="rejected", detail="post not found"
+                )
+            )
+            continue
+        elif isinstance(op, BatchCommentOp):
+            comment_results.append(result)
+            comments.append(
+                {"body": op.body, "post_id": op.post_id, "user_id": current_user.id}
+            )
+        else:
+            like = {"post_id": op.post_id, "user_id": current_user.id}
+            if like not in likes:
+                likes.append(like)
+            like_results.setdefault(op.post_id, []).append(result)
+        results.append(result)
+
+    comment_counts = Counter(comment["post_id"] for comment in comments)
+    like_counts = Counter()
+    try:
+        async with database.transaction():
+            # one multi-row INSERT per table
+            if posts:
+                assign_ids(
+                    post_results,
+                    await database.fetch_all(
+                        post_table.insert().values(posts).returning(post_table.c.id)
+                    ),
+                )
+            if comments:
+                assign_ids(
+                    comment_results,
+                    await database.fetch_all(
+                        comment_table.insert()
+                        .values(comments)
+                        .returning(comment_table.c.id)
+                    ),
+                )
+            if likes:
+                # likes that already exist are skipped and not counted again
+                inserted = await database.fetch_all(
+                    insert_or_ignore(like_table, "user_id", "post_id")
+                    .values(likes)
+                    .returning(like_table.c.id, like_table.c.post_id)
+                )
+                like_counts.update(row.post_id for row in inserted)
+                like_ids = {row.post_id: row.id for row in inserted}
+                already_liked = set(like_results) - set(like_ids)
+                if already_liked:
+                    rows = await database.fetch_all(
+                        sqlalchemy.select(like_table.c.id, like_table.c.post_id).where(
+                            like_table.c.user_id == current_user.id,
+                            like_table.c.post_id.in_(already_liked),
+                        )
+                    )
+                    like_ids.update({row.post_id: row.id for row in rows})
+                for post_id, waiting in like_results.items():
+                    for result in waiting:
+                        result.id = like_ids.get(post_id)
+            touched = set(comment_counts) | set(like_counts)
+            if touched:
+                await database.execute(
+                    post_table.update()
+                    .where(post_table.c.id.in_(touched))
+                    .values(
+                        like_count=per_post_increment(
+                            post_table.c.like_count, like_counts
+                        ),
+                        comment_count=per_post_increment(
+                            post_table.c.comment_count, comment_counts
+                        ),
+                        version=bump_post_version(),
+                    )
+                )
+                await refresh_hot_scores(touched)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"internal server error, database crash\n{e}"
+        )
+
+    if posts:
+        response_cache.invalidate_tag("feed")
+    for post_id in touched:
+        response_cache.invalidate_tag(f"post:{post_id}")
+        response_cache.invalidate_tag(f"comments:{post_id}")
+    if like_counts:
+        response_cache.invalidate_tag(f"feed:{PostSorting.most_liked.value}")
+    if touched:
+        response_cache.invalidate_tag(f"feed:{PostSorting.hot.value}")
+    return results
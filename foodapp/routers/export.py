@@ -0,0 +1,103 @@
+import json
+import logging
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+import sqlalchemy
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from foodapp.db.database import comment_table, db_connection, like_table, post_table
+from foodapp.models.user import UserIdentity
+from foodapp.security.user_security import get_current_operator
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+database = db_connection()
+
+POST_ROW, COMMENT_ROW, LIKE_ROW = 0, 1, 2
+
+
+def integer_constant(value: int):
+    # inlined rather than bound: postgres types a UNION column fed only by
+    # untyped parameters as text
+    return sqlalchemy.literal_column(str(value), sqlalchemy.Integer)
+
+
+def content_graph_query():
+    """
+    posts, comments and likes as one stream ordered by post, so every post is
+    followed by its own comments and likes and can be emitted as soon as the
+    next post starts. one server-side cursor, nothing held beyond one post
+    """
+    null_text = sqlalchemy.null().cast(sqlalchemy.String)
+    posts = sqlalchemy.select(
+        integer_constant(POST_ROW).label("kind"),
+        post_table.c.id.label("post_id"),
+        post_table.c.id.label("id"),
+        post_table.c.user_id,
+        post_table.c.body,
+        post_table.c.image_url,
+        post_table.c.like_count,
+    )
+    comments = sqlalchemy.select(
+        integer_constant(COMMENT_ROW),
+        comment_table.c.post_id,
+        comment_table.c.id,
+        comment_table.c.user_id,
+        comment_table.c.body,
+        null_text,
+        integer_constant(0),
+    )
+    likes = sqlalchemy.select(
+        integer_constant(LIKE_ROW),
+        like_table.c.post_id,
+        like_table.c.id,
+        like_table.c.user_id,
+        null_text,
+        null_text,
+        integer_constant(0),
+    )
+    union = sqlalchemy.union_all(posts, comments, likes).subquery()
+    return sqlalchemy.select(union).order_by(union.c.post_id, union.c.kind, union.c.id)
+
+
+async def export_lines() -> AsyncIterator[str]:
+    current = None
+    async for row in database.iterate(content_graph_query()):
+        if row.kind == POST_ROW:
+            if current:
+                yield json.dumps(current) + "\n"
+            current = {
+                "id": row.id,
+                "user_id": row.user_id,
+                "body": row.body,
+                "image_url": row.image_url,
+                "likes": row.like_count,
+                "comments": [],
+                "liked_by": [],
+            }
+        elif current is None or row.post_id != current["id"]:
+            # comment or like whose post is gone
+            continue
+        elif row.kind == COMMENT_ROW:
+            current["comments"].append(
+                {"id": row.id, "user_id": row.user_id, "body": row.body}
+            )
+        else:
+            current["liked_by"].append(row.user_id)
+    if current:
+        yield json.dumps(current) + "\n"
+
+
+@router.get("/export/posts")
+async def export_posts(
+    current_user: Annotated[UserIdentity, Depends(get_current_operator)],
+):
+    """
+    stream every post with its comments and likers embedded, one JSON object per
+    line; operators only, since liked_by exposes who liked what
+    """
+    logger.info(f"user {current_user.id} exporting posts")
+    return StreamingResponse(export_lines(), media_type="application/x-ndjson")
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+
+from foodapp.routers.post import like_buffer, response_cache
+from foodapp.routers.user import login_limiter
+from foodapp.security.user_security import (
+    hash_executor,
+    revocation_list,
+    token_claims_cache,
+    token_sweeper,
+    user_identity_cache,
+)
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    in-process counters used to size caches and buffers, per worker
+    """
+    return {
+        "post_cache": response_cache.stats(),
+        "like_buffer": like_buffer.stats(),
+        "password_hashing": hash_executor.stats(),
+        "user_cache": user_identity_cache.stats(),
+        "token_cache": token_claims_cache.stats(),
+        "login_limiter": login_limiter.stats(),
+        "token_sweeper": token_sweeper.stats(),
+        "revocations": revocation_list.stats(),
+    }
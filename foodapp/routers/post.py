@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
 from foodapp.models.user import User
-from foodapp.security.user_security import get_current_user, is_confirmed
+from foodapp.security.user_security import get_current_user
 from foodapp.models.post import (
     UserPost,
     UserPostIn,
@@ -8,27 +9,59 @@ from foodapp.models.post import (
     CommentIn,
     PostLikeIn,
     PostLike,
+    PostLikeCount,
+    PostLikeQueued,
     UserPostWithLike,
     UserPostWithComments,
+    PostLookup,
 )
-from foodapp.db.database import db_connection, post_table, comment_table, like_table
+from foodapp.db.database import (
+    db_connection,
+    insert_or_ignore,
+    post_table,
+    comment_table,
+    like_table,
+    user_table,
+)
+from foodapp.utils.pagination import encode_cursor, decode_cursor
+from foodapp.utils.etag import etag_matches, rows_etag, version_etag
+from foodapp.utils.serialization import dump_json, rows_to_json
+from foodapp.services.ranking import HOT_EPOCH, hot_score
+from foodapp.services.cache import ResponseCache
+from foodapp.services.like_buffer import LikeBuffer
+from foodapp.services.search import search_posts_query, search_terms
+from foodapp.core.config import config
+from pydantic import TypeAdapter
 from sqlalchemy import select
 import sqlalchemy
 import logging
 from typing import Annotated
+from collections.abc import Callable, Iterable
 from enum import Enum
-
+from collections import Counter
+import datetime
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
 logger = logging.getLogger(__name__)
 database = db_connection()
 
+# serialized /posts pages and /post/{id}/comments bodies, dropped by tag on writes:
+#   feed, feed:<sorting>  every cached page, or the pages of one sort mode
+#   post:<id>             every cached response that shows post <id>
+#   comments:<id>         the comment listing of post <id>
+response_cache = ResponseCache(
+    max_entries=config.POST_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.POST_CACHE_TTL_SECONDS,
+)
+posts_page_adapter = TypeAdapter(list[UserPostWithLike])
+
 
-select_liked_post = (
-    sqlalchemy.select(post_table, sqlalchemy.func.count(like_table.c.id).label("likes"))
-    .select_from(post_table.outerjoin(like_table))
-    .group_by(post_table.c.id)
+select_liked_post = sqlalchemy.select(
+    post_table, post_table.c.like_count.label("likes")
 )
 
 
@@ -44,6 +77,90 @@ async def find_post(post_id: int):
     return await database.fetch_one(query=query)
 
 
+def cached_json_response(
+    cached: tuple[bytes, dict], if_none_match: str | None = None
+) -> Response:
+    body, headers = cached
+    if "ETag" in headers and etag_matches(if_none_match, headers["ETag"]):
+        return not_modified(headers["ETag"])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def serialize_posts(rows) -> bytes:
+    """
+    JSON for a list of select_liked_post rows; with FAST_SERIALIZATION the trusted
+    rows skip per-row model validation and go straight to orjson
+    """
+    if config.FAST_SERIALIZATION:
+        return rows_to_json(rows, UserPostWithLike)
+    page = [UserPostWithLike.model_validate(row) for row in rows]
+    return posts_page_adapter.dump_json(page)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+async def find_post_version(post_id: int):
+    query = select(post_table.c.version).where(post_table.c.id == post_id)
+    return await database.fetch_val(query=query)
+
+
+def bump_post_version():
+    return post_table.c.version + 1
+
+
+async def refresh_hot_score(post_id: int) -> None:
+    """
+    recompute one post's hot_score from its counters; call inside the transaction
+    that changed them so the ranking never drifts from the counts
+    """
+    await refresh_hot_scores([post_id])
+
+
+def case_by_post_id(values: dict, type_, else_=None):
+    """
+    CASE posts.id WHEN ... THEN ... with every branch cast to type_. the branches
+    are all bind parameters, which postgres would otherwise resolve to text
+    """
+    return sqlalchemy.case(
+        {post_id: sqlalchemy.cast(value, type_) for post_id, value in values.items()},
+        value=post_table.c.id,
+        else_=None if else_ is None else sqlalchemy.cast(else_, type_),
+    )
+
+
+def hot_score_update(scores: dict[int, float]):
+    return (
+        post_table.update()
+        .where(post_table.c.id.in_(scores))
+        .values(hot_score=case_by_post_id(scores, sqlalchemy.Float))
+    )
+
+
+async def refresh_hot_scores(post_ids: Iterable[int]) -> None:
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    posts = await database.fetch_all(
+        select(
+            post_table.c.id,
+            post_table.c.like_count,
+            post_table.c.comment_count,
+            post_table.c.created_at,
+        ).where(post_table.c.id.in_(post_ids))
+    )
+    if not posts:
+        return
+    scores = {
+        post.id: hot_score(
+            post.like_count, post.comment_count, post.created_at or HOT_EPOCH
+        )
+        for post in posts
+    }
+    await database.execute(hot_score_update(scores))
+
+
 @router.post("/post", response_model=UserPost)
 async def create_post(
     post: UserPostIn, current_user: Annotated[User, Depends(get_current_user)]
@@ -52,15 +169,17 @@ async def create_post(
     this post endpoint is going to insert posts into database from clients post request
     """
     logger.info(f"creating user post with details: {post}")
-    # noqa
-    if not await is_confirmed(current_user.email):
+    if not current_user.confirmed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="your email is not confirmed, please check your spam folder and confirm your email.",
         )
     data = {**post.model_dump(), "user_id": current_user.id}
     logger.debug(data)
-    query = post_table.insert().values(data)
+    created_at = datetime.datetime.now(tz=datetime.UTC)
+    query = post_table.insert().values(
+        **data, created_at=created_at, hot_score=hot_score(0, 0, created_at)
+    )
     logger.debug(query)
     try:
         post_id = await database.execute(query=query)
@@ -68,6 +187,7 @@ async def create_post(
         raise HTTPException(
             status_code=500, detail="internal server error due to database crash"
         )
+    response_cache.invalidate_tag("feed")
     new_post = {**data, "id": post_id}
     return new_post
 
@@ -87,23 +207,47 @@ async def comment_post(
     query = comment_table.insert().values(comment)
     logger.debug(query)
     try:
-        comment_id = await database.execute(query)
+        async with database.transaction():
+            comment_id = await database.execute(query)
+            await database.execute(
+                post_table.update()
+                .where(post_table.c.id == comment["post_id"])
+                .values(
+                    comment_count=post_table.c.comment_count + 1,
+                    version=bump_post_version(),
+                )
+            )
+            await refresh_hot_score(comment["post_id"])
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"internal server error, database crash\n{str(e)}"
         )
 
+    response_cache.invalidate_tag(f"comments:{comment['post_id']}")
+    response_cache.invalidate_tag(f"feed:{PostSorting.hot.value}")
     unique_comment = {**comment, "id": comment_id}
     return unique_comment
 
 
 @router.get("/post/{post_id}", response_model=UserPost)
-async def get_post(post_id: int):
+async def get_post(
+    post_id: int,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
     logger.info("geting user post with id {post_id}")
+    if if_none_match:
+        version = await find_post_version(post_id)
+        if version is not None and etag_matches(
+            if_none_match, version_etag(post_id, version)
+        ):
+            return not_modified(version_etag(post_id, version))
+
     query = post_table.select().where(post_table.c.id == post_id)
     logger.debug(query)
     post_content = await database.fetch_one(query)
     if post_content:
+        response.headers["ETag"] = version_etag(post_id, post_content.version)
         return UserPost(**post_content)
     else:
         raise HTTPException(
@@ -115,64 +259,394 @@ class PostSorting(str, Enum):
     new = "new"
     old = "old"
     most_liked = "likes"
+    hot = "hot"
 
 
-@router.get("/posts", response_model=list[UserPostWithLike])
-async def get_posts(sorting: PostSorting = PostSorting.new):
+def posts_page_query(sorting: PostSorting, cursor: dict | None):
     """
-    this endpoint gonna retrive data from database and then send those retrieved data back to client
+    build a keyset page query: rows after the cursor position in the requested order,
+    so page N costs the same as page 1 (no OFFSET scan)
     """
-    logger.info("getting all posts up to 50 recent posts")
     if sorting == PostSorting.new:
         query = select_liked_post.order_by(sqlalchemy.desc(post_table.c.id))
+        if cursor:
+            query = query.where(post_table.c.id < cursor["id"])
 
     elif sorting == PostSorting.old:
         query = select_liked_post.order_by(sqlalchemy.asc(post_table.c.id))
+        if cursor:
+            query = query.where(post_table.c.id > cursor["id"])
+
+    elif sorting == PostSorting.hot:
+        # walks ix_posts_hot_score_id backwards, scores are maintained on write
+        score = post_table.c.hot_score
+        query = select_liked_post.order_by(
+            sqlalchemy.desc(score), sqlalchemy.desc(post_table.c.id)
+        )
+        if cursor:
+            query = query.where(
+                sqlalchemy.or_(
+                    score < cursor["score"],
+                    sqlalchemy.and_(
+                        score == cursor["score"], post_table.c.id < cursor["id"]
+                    ),
+                )
+            )
 
     else:
-        query = select_liked_post.order_by(sqlalchemy.desc("likes"))
+        # walks ix_posts_like_count_id backwards, no aggregation
+        likes = post_table.c.like_count
+        query = select_liked_post.order_by(
+            sqlalchemy.desc(likes), sqlalchemy.desc(post_table.c.id)
+        )
+        if cursor:
+            query = query.where(
+                sqlalchemy.or_(
+                    likes < cursor["likes"],
+                    sqlalchemy.and_(
+                        likes == cursor["likes"], post_table.c.id < cursor["id"]
+                    ),
+                )
+            )
+    return query
+
+
+def parse_posts_cursor(cursor: str, sorting: PostSorting) -> dict:
+    try:
+        position = decode_cursor(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    required = {"id": int}
+    if sorting == PostSorting.most_liked:
+        required["likes"] = int
+    elif sorting == PostSorting.hot:
+        required["score"] = (int, float)
+    if position.get("s") != sorting.value or not all(
+        isinstance(position.get(key), kind) for key, kind in required.items()
+    ):
+        raise HTTPException(
+            status_code=400, detail=f"cursor does not belong to sorting:{sorting.value}"
+        )
+    return position
+
+
+def next_posts_cursor(last_post, sorting: PostSorting) -> str:
+    position = {"s": sorting.value, "id": last_post.id}
+    if sorting == PostSorting.most_liked:
+        position["likes"] = last_post.likes
+    elif sorting == PostSorting.hot:
+        position["score"] = last_post.hot_score
+    return encode_cursor(position)
+
+
+@router.get("/posts/multi", response_model=list[PostLookup])
+async def get_posts_by_ids(
+    ids: Annotated[list[int], Query(min_length=1, max_length=MAX_PAGE_SIZE)],
+):
+    """
+    fetch up to 100 posts by id with a single IN query. results follow the order of
+    ?ids=, and ids with no post come back as {"id": ..., "found": false}
+    """
+    logger.info(f"getting {len(ids)} posts by id")
+    query = select_liked_post.where(post_table.c.id.in_(set(ids)))
     logger.debug(query)
+    try:
+        rows = await database.fetch_all(query)
+    except Exception:
+        raise HTTPException(status_code=500, detail="insternal server crash")
+
+    if config.FAST_SERIALIZATION:
+        found = {row.id: row for row in rows}
+        fields = tuple(UserPostWithLike.model_fields)
+        payload = [
+            {
+                "id": post_id,
+                "found": post_id in found,
+                "post": (
+                    {field: found[post_id][field] for field in fields}
+                    if post_id in found
+                    else None
+                ),
+            }
+            for post_id in ids
+        ]
+        return Response(content=dump_json(payload), media_type="application/json")
+
+    found = {row.id: UserPostWithLike.model_validate(row) for row in rows}
+    return [
+        PostLookup(id=post_id, found=post_id in found, post=found.get(post_id))
+        for post_id in ids
+    ]
+
+
+@router.get("/posts/search", response_model=list[UserPostWithLike])
+async def search_posts(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+):
+    """
+    full-text search over post bodies, best match first. all words must match;
+    the token for the next page is sent in the X-Next-Cursor header
+    """
+    terms = search_terms(q)
+    logger.info(f"searching posts for {terms}")
+    if not terms:
+        return []
+
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="invalid cursor")
+        if (
+            position.get("q") != terms
+            or not isinstance(position.get("id"), int)
+            or not isinstance(position.get("score"), (int, float))
+        ):
+            raise HTTPException(
+                status_code=400, detail="cursor does not belong to this search"
+            )
+
+    query = search_posts_query(terms, position).limit(limit + 1)
     logger.debug(query)
     try:
-        all_posts = await database.fetch_all(query=query)
+        found = await database.fetch_all(query)
     except Exception:
         raise HTTPException(status_code=500, detail="insternal server crash")
-    return all_posts
+    headers = {}
+    if len(found) > limit:
+        found = found[:limit]
+        last = found[-1]
+        headers["X-Next-Cursor"] = encode_cursor(
+            {"q": terms, "score": last.score, "id": last.id}
+        )
+    return cached_json_response((serialize_posts(found), headers))
 
 
-@router.get("/post/{post_id}/comments", response_model=UserPostWithComments)
-async def get_post_with_comments(post_id: int):
+@router.get("/posts", response_model=list[UserPostWithLike])
+async def get_posts(
+    sorting: PostSorting = PostSorting.new,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    this endpoint gonna retrive one page of posts from database and then send it back to client.
+    when more posts exist, the opaque token for the next page is sent in the X-Next-Cursor header
+    """
+    logger.info(f"getting up to {limit} posts sorted by {sorting.value}")
+    cache_key = ("posts", sorting.value, cursor, limit)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(cached, if_none_match)
+
+    position = parse_posts_cursor(cursor, sorting) if cursor else None
+    return await posts_page_response(
+        cache_key,
+        posts_page_query(sorting, position),
+        limit,
+        next_cursor=lambda last_post: next_posts_cursor(last_post, sorting),
+        tags=["feed", f"feed:{sorting.value}"],
+        if_none_match=if_none_match,
+    )
+
+
+@router.get("/user/{user_id}/posts", response_model=list[UserPostWithLike])
+async def get_user_posts(
+    user_id: int,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    one author's posts, newest first, as a single range scan over ix_posts_user_id_id.
+    the token for the next page is sent in the X-Next-Cursor header
     """
-    this endpoint is unique, it combines post and comment property that leads to foreign relation between those tables
+    logger.info(f"getting up to {limit} posts of user {user_id}")
+    cache_key = ("user_posts", user_id, cursor, limit)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(cached, if_none_match)
+
+    query = select_liked_post.where(post_table.c.user_id == user_id).order_by(
+        sqlalchemy.desc(post_table.c.id)
+    )
+    if cursor:
+        query = query.where(
+            post_table.c.id < parse_posts_cursor(cursor, PostSorting.new)["id"]
+        )
+    return await posts_page_response(
+        cache_key,
+        query,
+        limit,
+        next_cursor=lambda last_post: next_posts_cursor(last_post, PostSorting.new),
+        tags=["feed", f"user:{user_id}"],
+        if_none_match=if_none_match,
+    )
+
+
+async def posts_page_response(
+    cache_key: tuple,
+    query,
+    limit: int,
+    next_cursor: Callable,
+    tags: list[str],
+    if_none_match: str | None,
+) -> Response:
     """
-    query = comment_table.select().where(comment_table.c.post_id == post_id)
+    run a keyset page query, serialize it once and cache it tagged with every post
+    it shows; answers 304 from (id, version) alone when the client copy is current
+    """
+    # taken before any query so a write that lands meanwhile keeps the page out
+    generation = response_cache.generation()
+    # one extra row tells us whether another page exists without a COUNT query
+    query = query.limit(limit + 1)
+    if if_none_match:
+        # revalidate on (id, version) alone before paying for the full page
+        versions = await database.fetch_all(
+            query.with_only_columns(post_table.c.id, post_table.c.version)
+        )
+        if etag_matches(if_none_match, rows_etag(versions)):
+            return not_modified(rows_etag(versions))
     logger.debug(query)
+    try:
+        all_posts = await database.fetch_all(query=query)
+    except Exception:
+        raise HTTPException(status_code=500, detail="insternal server crash")
+    headers = {"ETag": rows_etag(all_posts)}
+    if len(all_posts) > limit:
+        all_posts = all_posts[:limit]
+        headers["X-Next-Cursor"] = next_cursor(all_posts[-1])
+
+    cached = (serialize_posts(all_posts), headers)
+    response_cache.set(
+        cache_key,
+        cached,
+        tags=[*tags, *(f"post:{post.id}" for post in all_posts)],
+        generation=generation,
+    )
+    return cached_json_response(cached)
 
+
+def post_with_comments_query(post_id: int, after: int, limit: int):
+    """
+    the post header and one page of its comments in a single round trip: the post
+    row left-joined to its comments past the cursor, walking ix_comments_post_id_id
+    """
+    return (
+        sqlalchemy.select(
+            post_table.c.id,
+            post_table.c.user_id,
+            post_table.c.body,
+            post_table.c.image_url,
+            post_table.c.like_count.label("likes"),
+            post_table.c.version,
+            comment_table.c.id.label("comment_id"),
+            comment_table.c.user_id.label("comment_user_id"),
+            comment_table.c.body.label("comment_body"),
+        )
+        .select_from(
+            post_table.outerjoin(
+                comment_table,
+                sqlalchemy.and_(
+                    comment_table.c.post_id == post_table.c.id,
+                    comment_table.c.id > after,
+                ),
+            )
+        )
+        .where(post_table.c.id == post_id)
+        .order_by(comment_table.c.id)
+        .limit(limit)
+    )
+
+
+def parse_comments_cursor(cursor: str) -> int:
     try:
-        all_comments = await database.fetch_all(query)
+        position = decode_cursor(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if not isinstance(position.get("c"), int):
+        raise HTTPException(status_code=400, detail="invalid comments cursor")
+    return position["c"]
 
-    except Exception:
-        raise HTTPException(status_code=404)
 
-    post_query = select_liked_post.where(post_table.c.id == post_id)
+@router.get("/post/{post_id}/comments", response_model=UserPostWithComments)
+async def get_post_with_comments(
+    post_id: int,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    this endpoint is unique, it combines post and comment property that leads to foreign relation between those tables.
+    comments come one page at a time, the token for the next page is sent in the X-Next-Cursor header
+    """
+    cache_key = ("comments", post_id, cursor, limit)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(cached, if_none_match)
+    generation = response_cache.generation()
+
+    after = parse_comments_cursor(cursor) if cursor else 0
+    if if_none_match:
+        version = await find_post_version(post_id)
+        etag = version_etag(post_id, version, "comments", after, limit)
+        if version is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    # one extra comment tells us whether another page exists
+    query = post_with_comments_query(post_id, after, limit + 1)
+    logger.debug(query)
     try:
-        post_detail = await database.fetch_one(post_query)
+        rows = await database.fetch_all(query)
     except Exception:
         raise HTTPException(
             status_code=500,
             detail="intrnal server error due to database crash when fetching post_text",
         )
-    if not post_detail:
+    if not rows:
         raise HTTPException(status_code=404, detail="Post not found")
-    all_comments = [Comment(**c) for c in all_comments]
-    post_detail = {
-        "id": post_id,
-        "user_id": post_detail.user_id,
-        "body": post_detail.body,
-        "likes": post_detail.likes,
-    }
 
-    return {"post": post_detail, "comment": all_comments}
+    post_detail = rows[0]
+    headers = {
+        "ETag": version_etag(post_id, post_detail.version, "comments", after, limit)
+    }
+    comment_rows = [row for row in rows if row.comment_id is not None]
+    if len(comment_rows) > limit:
+        comment_rows = comment_rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor({"c": comment_rows[-1].comment_id})
+    payload = {
+        "post": {
+            "body": post_detail.body,
+            "id": post_id,
+            "user_id": post_detail.user_id,
+            "image_url": post_detail.image_url,
+            "likes": post_detail.likes,
+        },
+        "comment": [
+            {
+                "body": row.comment_body,
+                "post_id": post_id,
+                "user_id": row.comment_user_id,
+                "id": row.comment_id,
+            }
+            for row in comment_rows
+        ],
+    }
+    if config.FAST_SERIALIZATION:
+        body = dump_json(payload)
+    else:
+        body = UserPostWithComments(**payload).model_dump_json().encode()
+    cached = (body, headers)
+    response_cache.set(
+        cache_key,
+        cached,
+        tags=[f"comments:{post_id}", f"post:{post_id}"],
+        generation=generation,
+    )
+    return cached_json_response(cached)
 
 
 @router.delete("/post/{post_id}")
@@ -193,7 +667,15 @@ async def delete_post(
 
     query = post_table.delete().where(post_table.c.id == post_id)
     logger.debug(query)
-    await database.execute(query)
+    async with database.transaction():
+        await database.execute(
+            like_table.delete().where(like_table.c.post_id == post_id)
+        )
+        await database.execute(
+            comment_table.delete().where(comment_table.c.post_id == post_id)
+        )
+        await database.execute(query)
+    response_cache.invalidate_tag(f"post:{post_id}")
     return {"status": "deleted"}
 
 
@@ -214,24 +696,137 @@ async def update_comment(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="not allowed to edit this comment",
         )
+    moved = comment.post_id != existing.post_id
+    if moved and not await find_post(comment.post_id):
+        raise HTTPException(status_code=404, detail="post doesn't exist")
     query = (
         comment_table.update()
         .values(comment.model_dump(exclude={"id", "user_id"}))
         .where(comment_table.c.id == comment_id)
     )
+    touched_posts = {existing.post_id, comment.post_id}
     try:
-        await database.execute(query)
+        async with database.transaction():
+            await database.execute(query)
+            # a comment moved to another post takes its count and rank with it
+            comment_count = post_table.c.comment_count
+            if moved:
+                comment_count = per_post_increment(
+                    post_table.c.comment_count,
+                    Counter({existing.post_id: -1, comment.post_id: 1}),
+                )
+            await database.execute(
+                post_table.update()
+                .where(post_table.c.id.in_(touched_posts))
+                .values(comment_count=comment_count, version=bump_post_version())
+            )
+            if moved:
+                await refresh_hot_scores(touched_posts)
     except Exception:
         raise HTTPException(
             status_code=404, detail=f"comment with comment_id:{comment_id} don't exist"
         )
+    for post_id in touched_posts:
+        response_cache.invalidate_tag(f"comments:{post_id}")
+    if moved:
+        response_cache.invalidate_tag(f"feed:{PostSorting.hot.value}")
     return {"status": "comment updated", "id": comment_id}
 
 
-@router.post("/like", status_code=status.HTTP_201_CREATED, response_model=PostLike)
+def invalidate_likes(post_id: int) -> None:
+    response_cache.invalidate_tag(f"post:{post_id}")
+    response_cache.invalidate_tag(f"feed:{PostSorting.most_liked.value}")
+    response_cache.invalidate_tag(f"feed:{PostSorting.hot.value}")
+
+
+async def change_like_count(post_id: int, delta: int) -> int:
+    """
+    apply delta to the post's like counter and return the new value from the same
+    statement; call inside the transaction that inserted or deleted the like
+    """
+    likes = await database.fetch_val(
+        post_table.update()
+        .where(post_table.c.id == post_id)
+        .values(like_count=post_table.c.like_count + delta, version=bump_post_version())
+        .returning(post_table.c.like_count)
+    )
+    await refresh_hot_score(post_id)
+    return likes
+
+
+def per_post_increment(column, counts: Counter):
+    return column + case_by_post_id(dict(counts), sqlalchemy.Integer, else_=0)
+
+
+async def flush_buffered_likes(pairs: list[tuple[int, int]]) -> int:
+    """
+    write a batch of write-behind likes: two IN queries drop likes on posts and by
+    users deleted since they were accepted, then one multi-row insert-or-ignore and
+    one CASE update of the counters in a single transaction. returns how many likes
+    were new
+    """
+    post_ids = {post_id for _, post_id in pairs}
+    rows = await database.fetch_all(
+        select(post_table.c.id).where(post_table.c.id.in_(post_ids))
+    )
+    existing_posts = {row.id for row in rows}
+    user_ids = {user_id for user_id, _ in pairs}
+    rows = await database.fetch_all(
+        select(user_table.c.id).where(user_table.c.id.in_(user_ids))
+    )
+    existing_users = {row.id for row in rows}
+    likes = [
+        {"user_id": user_id, "post_id": post_id}
+        for user_id, post_id in pairs
+        if post_id in existing_posts and user_id in existing_users
+    ]
+    if not likes:
+        return 0
+
+    async with database.transaction():
+        inserted = await database.fetch_all(
+            insert_or_ignore(like_table, "user_id", "post_id")
+            .values(likes)
+            .returning(like_table.c.post_id)
+        )
+        counts = Counter(row.post_id for row in inserted)
+        if counts:
+            await database.execute(
+                post_table.update()
+                .where(post_table.c.id.in_(counts))
+                .values(
+                    like_count=per_post_increment(post_table.c.like_count, counts),
+                    version=bump_post_version(),
+                )
+            )
+            await refresh_hot_scores(counts)
+    for post_id in counts:
+        invalidate_likes(post_id)
+    return sum(counts.values())
+
+
+# used only when LIKE_WRITE_BEHIND is on; started and drained by the app lifespan
+like_buffer = LikeBuffer(
+    flush_buffered_likes,
+    flush_size=config.LIKE_FLUSH_SIZE,
+    flush_interval=config.LIKE_FLUSH_INTERVAL_SECONDS,
+    max_attempts=config.LIKE_FLUSH_MAX_ATTEMPTS,
+)
+
+
+@router.post(
+    "/like",
+    status_code=status.HTTP_201_CREATED,
+    response_model=PostLike,
+    responses={status.HTTP_202_ACCEPTED: {"model": PostLikeQueued}},
+)
 async def like_post(
     postlike: PostLikeIn, liker: Annotated[User, Depends(get_current_user)]
 ):
+    """
+    idempotent: liking an already liked post leaves one like and returns it again.
+    with LIKE_WRITE_BEHIND the like is queued for a batched write and answered with 202
+    """
     logger.debug("Liking post")
     post = await find_post(postlike.post_id)
     if not post:
@@ -239,14 +834,72 @@ async def like_post(
             status_code=status.HTTP_404_NOT_FOUND, detail="post not found"
         )
     data = {**postlike.model_dump(), "user_id": liker.id}
-    like_query = like_table.insert().values(data)
+    if config.LIKE_WRITE_BEHIND:
+        like_buffer.add(liker.id, postlike.post_id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED, content={**data, "status": "queued"}
+        )
+    like_query = (
+        insert_or_ignore(like_table, "user_id", "post_id")
+        .values(data)
+        .returning(like_table.c.id)
+    )
     logger.debug(like_query)
 
-    result = await database.execute(like_query)
+    async with database.transaction():
+        like_id = await database.fetch_val(like_query)
+        if like_id is not None:
+            likes = await change_like_count(postlike.post_id, 1)
+
+    if like_id is None:
+        existing = await database.fetch_one(
+            sqlalchemy.select(like_table.c.id, post_table.c.like_count)
+            .select_from(like_table.join(post_table))
+            .where(
+                like_table.c.user_id == liker.id,
+                like_table.c.post_id == postlike.post_id,
+            )
+        )
+        like_id, likes = existing.id, existing.like_count
+    else:
+        invalidate_likes(postlike.post_id)
+
+    return {**data, "id": like_id, "likes": likes}
+
+
+@router.delete("/like/{post_id}", response_model=PostLikeCount)
+async def unlike_post(post_id: int, liker: Annotated[User, Depends(get_current_user)]):
+    """
+    idempotent: unliking a post that isn't liked just returns the current count
+    """
+    logger.debug("Unliking post")
+    # a like still waiting in the write-behind buffer must not be written later
+    await like_buffer.discard(liker.id, post_id)
+    unlike_query = (
+        like_table.delete()
+        .where(like_table.c.user_id == liker.id, like_table.c.post_id == post_id)
+        .returning(like_table.c.id)
+    )
+    async with database.transaction():
+        like_id = await database.fetch_val(unlike_query)
+        if like_id is not None:
+            likes = await change_like_count(post_id, -1)
+
+    if like_id is None:
+        likes = await database.fetch_val(
+            select(post_table.c.like_count).where(post_table.c.id == post_id)
+        )
+        if likes is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="post not found"
+            )
+    else:
+        invalidate_likes(post_id)
+
+    return {"post_id": post_id, "user_id": liker.id, "likes": likes}
 
-    return {"id": result, "post_id": postlike.post_id, "user_id": liker.id}
 
 @router.get("/sentry-debug")
 async def trigger_error():
     division_by_zero = 1 / 0
-    return division_by_zero
\ No newline at end of file
+    return division_by_zero
@@ -8,6 +8,7 @@ from fastapi import (
     Depends,
 )
 from foodapp.models.user import (
+    UserIdentity,
     UserIn,
     Token,
     User,
@@ -31,25 +32,74 @@ from foodapp.security.user_security import (
     create_access_token,
     get_current_user,
     get_subject_token_type,
+    oauth2_scheme,
     create_confirm_token,
     create_refresh_token,
+    refresh_token_expires_at,
+    bump_token_version,
+    remember_user,
     refresh_token_rotation,
+    rehash_password_if_needed,
+    revoke_access_token,
+    revoke_all_access_tokens,
     verify_password,
     create_password_reset_token,
+    published_jwks,
     store_password_reset_token,
+    token_digest,
     validate_password_reset_token,
 )
 from foodapp.core.config import config
+from foodapp.services.rate_limit import (
+    InMemoryRateLimitBackend,
+    LoginLimiter,
+    RateLimited,
+    client_ip,
+    parse_networks,
+)
 from urllib.parse import urlparse
 
 import logging
+import math
 import uuid
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 database = db_connection()
+login_limiter = LoginLimiter(
+    InMemoryRateLimitBackend(),
+    ip_rate_per_minute=config.LOGIN_IP_RATE_PER_MINUTE,
+    ip_burst=config.LOGIN_IP_BURST,
+    email_rate_per_minute=config.LOGIN_EMAIL_RATE_PER_MINUTE,
+    email_burst=config.LOGIN_EMAIL_BURST,
+    max_concurrent=config.LOGIN_MAX_CONCURRENT,
+)
+# proxies whose X-Forwarded-For entries are believed when keying the ip bucket
+trusted_proxies = parse_networks(config.TRUSTED_PROXIES)
+
+
+@asynccontextmanager
+async def login_admission(request: Request, email: str):
+    """
+    refuse a password check with 429 before it reaches argon2 when the client
+    ip or the email is over budget or too many checks are already running
+    """
+    peer = request.client.host if request.client else "unknown"
+    ip = client_ip(peer, request.headers.get("x-forwarded-for"), trusted_proxies)
+    try:
+        async with login_limiter.admit(ip, email):
+            yield
+    except RateLimited as e:
+        logger.warning(f"login rate limited by {e.reason}", extra={"email": email})
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="too many login attempts, please retry later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        ) from e
+
 
 @router.post("/register", status_code=201)
 async def register(
@@ -70,17 +120,22 @@ async def register(
         logger.debug(user_query)
 
         try:
-            await database.execute(user_query)
+            user_id = await database.execute(user_query)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"database crash:{e}")
-    access_token = create_access_token(email)
+    access_token = create_access_token(
+        email, UserIdentity(id=user_id, email=email, confirmed=False)
+    )
     confirm_token = create_confirm_token(email)
     refresh_id = str(uuid.uuid4())
     refresh_token = create_refresh_token(email=email, jti=refresh_id)
-    hashed_refresh_token = await get_password_hash(refresh_token)
+    hashed_refresh_token = token_digest(refresh_token)
 
     refresh_query = refreshtoken_table.insert().values(
-        jti=refresh_id, user_email=user.email, hashed_token=hashed_refresh_token
+        jti=refresh_id,
+        user_email=user.email,
+        hashed_token=hashed_refresh_token,
+        expires_at=refresh_token_expires_at(),
     )
     try:
         await database.execute(refresh_query)
@@ -116,30 +171,47 @@ async def register(
 
 
 @router.post("/login")
-async def login(user: UserIn, response: Response):
-    user_exist = await get_user(user.email)
-    if not user_exist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="user don't exist,incorrect passowrd or email",
-        )
-    if not await verify_password(user.password, user_exist.password):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="incorrect password or email"
-        )
-    access_token = create_access_token(user_exist.email)
+async def login(user: UserIn, request: Request, response: Response):
+    async with login_admission(request, user.email):
+        user_exist = await get_user(user.email)
+        if not user_exist:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="user don't exist,incorrect passowrd or email",
+            )
+        if not await verify_password(user.password, user_exist.password):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="incorrect password or email",
+            )
+        await rehash_password_if_needed(user.email, user.password, user_exist.password)
+    identity = remember_user(user_exist)
+    access_token = create_access_token(user_exist.email, identity)
     # confirm_token = create_confirm_token(email)
     refresh_id = str(uuid.uuid4())
     refresh_token = create_refresh_token(email=user_exist.email, jti=refresh_id)
-    hashed_refresh_token = await get_password_hash(refresh_token)
+    hashed_refresh_token = token_digest(refresh_token)
 
+    token_row = {
+        "jti": refresh_id,
+        "hashed_token": hashed_refresh_token,
+        "expires_at": refresh_token_expires_at(),
+    }
     refresh_query = (
         refreshtoken_table.update()
-        .values(jti=refresh_id, hashed_token=hashed_refresh_token)
+        .values(**token_row)
         .where(refreshtoken_table.c.user_email == user_exist.email)
+        .returning(refreshtoken_table.c.id)
     )
     try:
-        await database.execute(refresh_query)
+        # the row is gone once the sweeper removed it or a password reset
+        # revoked it, so the first login after that starts a new one
+        if await database.fetch_val(refresh_query) is None:
+            await database.execute(
+                refreshtoken_table.insert().values(
+                    user_email=user_exist.email, **token_row
+                )
+            )
 
     except Exception as e:
         raise HTTPException(
@@ -161,13 +233,23 @@ async def login(user: UserIn, response: Response):
 
 
 @router.post("/token")
-async def get_profile(user: UserIn):
-    user = await authenticate_user(email=user.email, password=user.password)
-    access_token = create_access_token(user.email)
+async def get_profile(user: UserIn, request: Request):
+    async with login_admission(request, user.email):
+        user = await authenticate_user(email=user.email, password=user.password)
+    access_token = create_access_token(user.email, user)
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.get("/.well-known/jwks.json")
+async def jwks(response: Response):
+    """
+    public keys that verify access tokens, for services that check them locally
+    """
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return published_jwks()
+
+
 @router.get("/myemail")
 async def get_email(token: Token):
     user = await get_current_user(token.token)
@@ -185,6 +267,7 @@ async def confirm_email(token: str):
     logger.debug(confirm_query)
 
     await database.execute(confirm_query)
+    await bump_token_version(email)
 
     return {"detail": "user has been confirmed"}
 
@@ -217,6 +300,45 @@ async def refresh_token(
     return {"status": "secessfully refreshed", "access token": new_access_token}
 
 
+async def end_refresh_session(email: str, response: Response) -> None:
+    await database.execute(
+        refreshtoken_table.delete().where(refreshtoken_table.c.user_email == email)
+    )
+    response.delete_cookie(
+        key="refresh_token",
+        path="/auth/refresh",
+        secure=True,
+        httponly=True,
+        samesite="strict",
+    )
+
+
+@router.post("/logout")
+async def logout(
+    current_user: Annotated[UserIdentity, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+    response: Response,
+):
+    await revoke_access_token(token)
+    await end_refresh_session(current_user.email, response)
+
+    return {"status": "seccussfully logged out"}
+
+
+@router.post("/logout/all")
+async def logout_all(
+    current_user: Annotated[UserIdentity, Depends(get_current_user)],
+    response: Response,
+):
+    """
+    revoke every access token of the user, on every device
+    """
+    await revoke_all_access_tokens(current_user.email)
+    await end_refresh_session(current_user.email, response)
+
+    return {"status": "seccussfully logged out of all sessions"}
+
+
 @router.delete("/delete")
 async def delete_account(current_user: Annotated[User, Depends(get_current_user)]):
     # first delete user's refresh token
@@ -240,6 +362,10 @@ async def delete_account(current_user: Annotated[User, Depends(get_current_user)
             detail=f"unable to delete user's refresh token:{e}",
         )
 
+    # the row is about to go, so bump first to invalidate the token claims,
+    # and revoke the tokens so no worker accepts their claims any more
+    await bump_token_version(current_user.email)
+    await revoke_all_access_tokens(current_user.email)
     delete_user_query = user_table.delete().where(
         user_table.c.email == current_user.email
     )
@@ -308,6 +434,8 @@ async def reset_password(payload: PasswordResetConfirm):
         )
     )
     await database.execute(update_password_query)
+    await bump_token_version(email)
+    await revoke_all_access_tokens(email)
 
     delete_reset_query = password_reset_table.delete().where(
         password_reset_table.c.jti == reset_id,
@@ -0,0 +1,175 @@
+"""
+asymmetric signing keys for access tokens.
+
+with a key ring configured, access tokens are signed by the active key
+(EdDSA for ed25519 keys, RS256 for rsa keys) and carry its kid in the header.
+the public halves are published as a JWKS document, so other services can
+verify tokens themselves without SECRET_KEY or a call to this api.
+
+rotation keeps the previous key verifiable for an overlap window: rotate()
+makes a new key active and retires the old one, which keeps verifying and
+stays in the JWKS until overlap_seconds after retirement, longer than any
+token it signed can live. a directory has no record of when a key was
+retired, so from_directory takes every key older than the active one as
+retired when the active key's file was written; keys newer than the active one
+are published ahead of their switch. to rotate, write the new key (or touch its
+file) when it becomes active, and delete the old file whenever convenient after
+the overlap.
+
+    python -m foodapp.security.keyring <keys dir> [ed25519|rsa]
+"""
+
+import os
+import sys
+import time
+import uuid
+from dataclasses import dataclass, replace
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    private_key: ed25519.Ed25519PrivateKey | rsa.RSAPrivateKey
+    created_at: float
+    retired_at: float | None = None
+
+    @property
+    def public_key(self):
+        return self.private_key.public_key()
+
+    def jwk(self) -> dict:
+        if self.algorithm == "EdDSA":
+            jwk = OKPAlgorithm.to_jwk(self.public_key, as_dict=True)
+        else:
+            jwk = RSAAlgorithm.to_jwk(self.public_key, as_dict=True)
+        return {**jwk, "kid": self.kid, "alg": self.algorithm, "use": "sig"}
+
+
+def algorithm_for(private_key) -> str:
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return "EdDSA"
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return "RS256"
+    raise ValueError(f"unsupported signing key type: {type(private_key).__name__}")
+
+
+def generate_key(kind: str = "ed25519", kid: str | None = None) -> SigningKey:
+    if kind == "ed25519":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif kind == "rsa":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError(f"unknown key kind: {kind}")
+    return SigningKey(
+        kid=kid or uuid.uuid4().hex,
+        algorithm=algorithm_for(private_key),
+        private_key=private_key,
+        created_at=time.time(),
+    )
+
+
+class KeyRing:
+    def __init__(
+        self,
+        keys: list[SigningKey],
+        active_kid: str | None = None,
+        overlap_seconds: float = 3600.0,
+    ) -> None:
+        if not keys:
+            raise ValueError("a key ring needs at least one key")
+        self.overlap_seconds = overlap_seconds
+        self._keys = {key.kid: key for key in keys}
+        if active_kid is None:
+            active_kid = max(keys, key=lambda key: key.created_at).kid
+        if active_kid not in self._keys:
+            raise ValueError(f"active key {active_kid} is not in the key ring")
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_directory(
+        cls, path: str, active_kid: str | None = None, overlap_seconds: float = 3600.0
+    ) -> "KeyRing":
+        """
+        one private key per <kid>.pem file; without active_kid the newest file signs.
+        files older than the active key's are retired at its mtime
+        """
+        keys = []
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".pem"):
+                continue
+            file_path = os.path.join(path, name)
+            with open(file_path, "rb") as pem:
+                private_key = serialization.load_pem_private_key(
+                    pem.read(), password=None
+                )
+            keys.append(
+                SigningKey(
+                    kid=name.removesuffix(".pem"),
+                    algorithm=algorithm_for(private_key),
+                    private_key=private_key,
+                    created_at=os.path.getmtime(file_path),
+                )
+            )
+        ring = cls(keys, active_kid=active_kid, overlap_seconds=overlap_seconds)
+        activated_at = ring.signing_key.created_at
+        for key in keys:
+            if key.created_at < activated_at:
+                ring._keys[key.kid] = replace(key, retired_at=activated_at)
+        return ring
+
+    @property
+    def signing_key(self) -> SigningKey:
+        return self._keys[self.active_kid]
+
+    def _in_overlap(self, key: SigningKey, now: float) -> bool:
+        return key.retired_at is None or now < key.retired_at + self.overlap_seconds
+
+    def verification_key(self, kid: str) -> SigningKey | None:
+        key = self._keys.get(kid)
+        if key is None or not self._in_overlap(key, time.time()):
+            return None
+        return key
+
+    def rotate(self, new_key: SigningKey) -> None:
+        now = time.time()
+        self._keys[self.active_kid] = replace(self.signing_key, retired_at=now)
+        self._keys[new_key.kid] = new_key
+        self.active_kid = new_key.kid
+        self.prune(now)
+
+    def prune(self, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        self._keys = {
+            kid: key for kid, key in self._keys.items() if self._in_overlap(key, now)
+        }
+
+    def jwks(self) -> dict:
+        now = time.time()
+        return {
+            "keys": [key.jwk() for key in self._keys.values() if self._in_overlap(key, now)]
+        }
+
+
+def write_key(path: str, key: SigningKey) -> str:
+    file_path = os.path.join(path, f"{key.kid}.pem")
+    pem = key.private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(pem)
+    return file_path
+
+
+if __name__ == "__main__":
+    keys_dir = sys.argv[1]
+    kind = sys.argv[2] if len(sys.argv) > 2 else "ed25519"
+    os.makedirs(keys_dir, exist_ok=True)
+    print(write_key(keys_dir, generate_key(kind)))
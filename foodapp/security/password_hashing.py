@@ -0,0 +1,212 @@
+"""
+argon2 hashing off the event loop.
+
+argon2 is deliberately slow and memory hard, so calling it inline stalls every
+other request on the worker for the length of a hash. hashes and verifies run
+in a dedicated executor instead: threads by default (argon2-cffi releases the
+gil while hashing) or processes when configured. the executor admits at most
+max_pending calls, running or queued, and turns the rest away straight away
+with HashExecutorBusy rather than letting a login burst build an unbounded
+backlog.
+
+the argon2 cost parameters are calibrated for the host class rather than taken
+from the library defaults: calibrate() picks the largest memory cost (up to a
+cap) and then the largest time cost that still hashes within a target latency.
+it runs once, as a command, and its output goes into the environment every
+worker and replica reads, so they all hash with the same parameters:
+
+    python -m foodapp.security.password_hashing
+
+hashes made with other parameters keep verifying; needs_rehash() tells the
+login path to upgrade those whose cost is off by more than a tolerance.
+
+this module only depends on argon2 so process workers import it cheaply.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple, TypeVar
+
+from argon2 import PasswordHasher, extract_parameters
+from argon2.exceptions import InvalidHashError, VerificationError
+from argon2.low_level import ARGON2_VERSION
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+password_hasher = PasswordHasher()
+
+
+class Argon2Parameters(NamedTuple):
+    time_cost: int
+    memory_cost: int  # KiB
+    parallelism: int
+
+
+def current_parameters() -> Argon2Parameters:
+    return Argon2Parameters(
+        password_hasher.time_cost,
+        password_hasher.memory_cost,
+        password_hasher.parallelism,
+    )
+
+
+def use_parameters(parameters: Argon2Parameters) -> None:
+    global password_hasher
+    password_hasher = PasswordHasher(**parameters._asdict())
+
+
+def hash_password(password: str) -> str:
+    return password_hasher.hash(password)
+
+
+def check_password(hashed_password: str, plain_password: str) -> bool:
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def needs_rehash(hashed_password: str, tolerance: float = 0.0) -> bool:
+    """
+    whether the hash's cost, time_cost * memory_cost, is more than tolerance
+    cheaper or dearer than the current parameters'; a hash of another argon2
+    type or version always needs one
+    """
+    try:
+        stored = extract_parameters(hashed_password)
+    except InvalidHashError:
+        return True
+    current = password_hasher
+    if stored.type != current.type or stored.version != ARGON2_VERSION:
+        return True
+    ratio = (stored.time_cost * stored.memory_cost) / (
+        current.time_cost * current.memory_cost
+    )
+    return not 1 / (1 + tolerance) <= ratio <= 1 + tolerance
+
+
+def measure(parameters: Argon2Parameters, rounds: int = 3) -> float:
+    """
+    fastest of rounds hashes with parameters, in seconds
+    """
+    hasher = PasswordHasher(**parameters._asdict())
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hasher.hash("calibration password")
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def calibrate(
+    target_seconds: float,
+    max_memory_kib: int = 65536,
+    min_memory_kib: int = 19456,
+    parallelism: int = 1,
+    max_time_cost: int = 10,
+) -> Argon2Parameters:
+    """
+    memory is what makes argon2 expensive to attack, so spend the budget on it
+    first: halve the memory cost from max_memory_kib until one pass fits the
+    target (never below min_memory_kib), then add passes while they still fit
+    """
+    memory_cost = max_memory_kib
+    parameters = Argon2Parameters(1, memory_cost, parallelism)
+    while memory_cost > min_memory_kib and measure(parameters) > target_seconds:
+        memory_cost = max(memory_cost // 2, min_memory_kib)
+        parameters = parameters._replace(memory_cost=memory_cost)
+    while parameters.time_cost < max_time_cost:
+        candidate = parameters._replace(time_cost=parameters.time_cost + 1)
+        if measure(candidate) > target_seconds:
+            break
+        parameters = candidate
+    return parameters
+
+
+class HashExecutorBusy(Exception):
+    """
+    raised when max_pending hashing calls are already running or queued
+    """
+
+
+class HashExecutor:
+    def __init__(
+        self, workers: int = 4, max_pending: int = 64, processes: bool = False
+    ) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.processes = processes
+        self._executor: Executor | None = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                # spawn, not fork: forking a process that runs an event loop
+                # and a db pool copies state the workers must not touch
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=use_parameters,
+                    initargs=(current_parameters(),),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="argon2"
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashExecutorBusy(
+                f"{self.pending} password hashes already pending"
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "processes": self.processes,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+if __name__ == "__main__":
+    from foodapp.core.config import BaseConfig, config
+
+    parameters = calibrate(
+        config.ARGON2_TARGET_MS / 1000,
+        max_memory_kib=config.ARGON2_MAX_MEMORY_KIB,
+        min_memory_kib=config.ARGON2_MIN_MEMORY_KIB,
+        parallelism=config.ARGON2_PARALLELISM or min(os.cpu_count() or 1, 4),
+    )
+    # the variables as the running env reads them, e.g. PROD_ARGON2_TIME_COST
+    env_state = BaseConfig().ENV_STATE
+    prefix = f"{env_state.upper()}_" if env_state else ""
+    print(f"{prefix}ARGON2_TIME_COST={parameters.time_cost}")
+    print(f"{prefix}ARGON2_MEMORY_COST_KIB={parameters.memory_cost}")
+    print(f"{prefix}ARGON2_PARALLELISM={parameters.parallelism}")
@@ -1,15 +1,31 @@
 import sqlalchemy
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from argon2 import PasswordHasher
 from foodapp.db.database import (
     user_table,
     db_connection,
     refreshtoken_table,
     password_reset_table,
+    revoked_token_table,
 )
-from foodapp.core.config import get_secrets
+from foodapp.core.config import config, get_secrets
+from foodapp.models.user import UserIdentity
+from foodapp.services.cache import ResponseCache
+from foodapp.services.revocation import RevocationList
+from foodapp.services.token_sweeper import TokenSweeper
+from foodapp.security import password_hashing
+from foodapp.security.keyring import KeyRing
+from foodapp.security.password_hashing import (
+    HashExecutor,
+    HashExecutorBusy,
+    check_password,
+    hash_password,
+)
+import hashlib
+import hmac
 import logging
+import time
+import uuid
 import jwt
 from jwt import ExpiredSignatureError, PyJWTError
 import datetime
@@ -23,8 +39,62 @@ SECRET_KEY = secret_keys.SECRET_KEY
 ALGORITHM = secret_keys.ALGORITHM
 REFRESH_TOKEN_SECRET_KEY = secret_keys.REFRESH_TOKEN_SECRET_KEY
 REFRESH_TOKEN_ALGORITHM = secret_keys.REFRESH_TOKEN_ALGORITHM
+TOKEN_DIGEST_KEY = (
+    secret_keys.TOKEN_DIGEST_KEY or REFRESH_TOKEN_SECRET_KEY or ""
+).encode()
+LEGACY_TOKEN_HASH_PREFIX = "$argon2"
+ACCEPT_HMAC_ACCESS_TOKENS = secret_keys.JWT_ACCEPT_HMAC_ACCESS_TOKENS
+# with JWT_KEYS_DIR set, access tokens are signed asymmetrically and can be
+# verified by anyone holding the published JWKS; otherwise they use SECRET_KEY
+key_ring = (
+    KeyRing.from_directory(
+        secret_keys.JWT_KEYS_DIR,
+        active_kid=secret_keys.JWT_ACTIVE_KID,
+        overlap_seconds=secret_keys.JWT_KEY_OVERLAP_SECONDS,
+    )
+    if secret_keys.JWT_KEYS_DIR
+    else None
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-password_hasher = PasswordHasher()
+hash_executor = HashExecutor(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+    processes=config.PASSWORD_HASH_PROCESSES,
+)
+# id, email and confirmed per email; writers in this worker call forget_user,
+# other workers see the change once the short ttl runs out
+user_identity_cache = ResponseCache(
+    max_entries=config.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.USER_CACHE_TTL_SECONDS,
+)
+token_sweeper = TokenSweeper(
+    database,
+    [refreshtoken_table, password_reset_table, revoked_token_table],
+    batch_size=config.TOKEN_SWEEP_BATCH_SIZE,
+    batch_pause=config.TOKEN_SWEEP_BATCH_PAUSE_SECONDS,
+    interval=config.TOKEN_SWEEP_INTERVAL_SECONDS,
+)
+# verified claims of access, confirmation and reset tokens by sha256 of the token; every entry
+# expires with its token, ttl_seconds only caps tokens with a far-off exp
+token_claims_cache = ResponseCache(
+    max_entries=config.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.TOKEN_CACHE_MAX_TTL_SECONDS,
+)
+# access tokens revoked by logout, checked in memory on every request
+revocation_list = RevocationList(
+    database,
+    revoked_token_table,
+    refresh_interval=config.REVOCATION_REFRESH_SECONDS,
+    rebuild_interval=config.REVOCATION_REBUILD_SECONDS,
+)
+
+
+# accounts allowed on operator-only endpoints
+operator_emails = {
+    email.strip()
+    for email in (config.OPERATOR_EMAILS or "").split(",")
+    if email.strip()
+}
 
 
 def create_credentials_exception(
@@ -40,6 +110,19 @@ def access_token_expire_minutes() -> int:
     return 30
 
 
+# newest token_version read from the database per email. access tokens
+# carrying an older version have stale claims; entries outlive every token
+# they could apply to
+token_versions = ResponseCache(
+    max_entries=config.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=access_token_expire_minutes() * 60,
+)
+# versions this worker bumped, with the monotonic time they stop mattering.
+# unlike token_versions nothing is evicted before then, so a bump can't be
+# forgotten while tokens it made stale are still valid
+bumped_token_versions: dict[str, tuple[int, float]] = {}
+
+
 def confirm_token_expire_minutes() -> int:
     return 15
 
@@ -52,12 +135,36 @@ def password_reset_token_expire_minutes() -> int:
     return 30
 
 
-def create_access_token(email: str):
+def create_access_token(email: str, user: UserIdentity | None = None):
+    """
+    with user, the token also carries the uid, confirmed and token version
+    claims that let get_current_user skip the database
+    """
     logger.debug("creating access token", extra={"email": email})
     expire = datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(
         minutes=access_token_expire_minutes()
     )
-    jwt_data = {"sub": email, "exp": expire, "type": "access"}
+    # jti and a sub-second iat let logout revoke this token, or every token
+    # issued up to that moment, without touching tokens issued afterwards
+    jwt_data = {
+        "sub": email,
+        "exp": expire,
+        "iat": time.time(),
+        "jti": uuid.uuid4().hex,
+        "type": "access",
+    }
+    if user is not None:
+        jwt_data.update(
+            uid=user.id, confirmed=user.confirmed, ver=user.token_version
+        )
+    if key_ring is not None:
+        signing_key = key_ring.signing_key
+        return jwt.encode(
+            payload=jwt_data,
+            key=signing_key.private_key,
+            algorithm=signing_key.algorithm,
+            headers={"kid": signing_key.kid},
+        )
     encoded_jwt = jwt.encode(payload=jwt_data, key=SECRET_KEY, algorithm=ALGORITHM)
 
     return encoded_jwt
@@ -78,10 +185,20 @@ def create_confirm_token(email: str):
     return encoded_confirm_token
 
 
-def create_refresh_token(email: str, jti: str):
-    expire_date = datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(
+def refresh_token_expires_at() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(
         days=refresh_token_expire_days()
     )
+
+
+def password_reset_token_expires_at() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(
+        minutes=password_reset_token_expire_minutes()
+    )
+
+
+def create_refresh_token(email: str, jti: str):
+    expire_date = refresh_token_expires_at()
     refresh_payload = {"sub": email, "jti": jti, "exp": expire_date, "type": "refresh"}
 
     refresh_token = jwt.encode(
@@ -93,9 +210,7 @@ def create_refresh_token(email: str, jti: str):
 
 
 def create_password_reset_token(email: str, jti: str):
-    expire = datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(
-        minutes=password_reset_token_expire_minutes()
-    )
+    expire = password_reset_token_expires_at()
     reset_payload = {"sub": email, "jti": jti, "exp": expire, "type": "password_reset"}
     return jwt.encode(payload=reset_payload, key=SECRET_KEY, algorithm=ALGORITHM)
 
@@ -126,11 +241,47 @@ def validate_refresh_token(token: str) -> dict:
     return payload
 
 
-def get_subject_token_type(
-    token: str, type: Literal["access", "confirmation", "password_reset"]
-) -> str:
-    try:
+def verify_token(token: str) -> dict:
+    """
+    claims of a token signed by a key_ring key (named by the kid header) or
+    with SECRET_KEY. the algorithm always comes from the key, never from the
+    token header, so a public key can't be passed off as an hmac secret.
+    with a key ring and ACCEPT_HMAC_ACCESS_TOKENS off, only confirmation and
+    reset tokens may use SECRET_KEY.
+    """
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
         payload = jwt.decode(jwt=token, key=SECRET_KEY, algorithms=[ALGORITHM])
+        if (
+            key_ring is not None
+            and not ACCEPT_HMAC_ACCESS_TOKENS
+            and payload.get("type") == "access"
+        ):
+            raise jwt.InvalidTokenError("access token is not signed by the key ring")
+        return payload
+    signing_key = key_ring.verification_key(kid) if key_ring is not None else None
+    if signing_key is None:
+        raise jwt.InvalidKeyError(f"unknown or retired signing key {kid}")
+    return jwt.decode(
+        jwt=token, key=signing_key.public_key, algorithms=[signing_key.algorithm]
+    )
+
+
+def published_jwks() -> dict:
+    return key_ring.jwks() if key_ring is not None else {"keys": []}
+
+
+def decode_token(token: str) -> dict:
+    """
+    claims of an access, confirmation or reset token, verified once and then
+    served from token_claims_cache until the token expires
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_claims_cache.get(key)
+    if payload is not None:
+        return payload
+    try:
+        payload = verify_token(token)
 
     except ExpiredSignatureError as e:
         raise HTTPException(
@@ -142,6 +293,23 @@ def get_subject_token_type(
     except PyJWTError as e:
         raise create_credentials_exception(detail="invalid token") from e
 
+    # tokens without exp never expire on their own, so they aren't cached
+    if isinstance(payload.get("exp"), (int, float)):
+        token_claims_cache.set(key, payload, ttl_seconds=payload["exp"] - time.time())
+    return payload
+
+
+def get_subject_token_type(
+    token: str, type: Literal["access", "confirmation", "password_reset"]
+) -> str:
+    return get_token_claims(token, type)["sub"]
+
+
+def get_token_claims(
+    token: str, type: Literal["access", "confirmation", "password_reset"]
+) -> dict:
+    payload = decode_token(token)
+
     email = payload.get("sub")
     token_type = payload.get("type")
     if token_type != type or token_type is None:
@@ -152,17 +320,55 @@ def get_subject_token_type(
     if not email:
         raise create_credentials_exception(detail="Token is missing 'sub' field")
 
-    return email
+    return payload
+
+
+def token_digest(token: str) -> str:
+    """
+    keyed sha256 of a refresh or reset token, which is what the token tables
+    store. these tokens are long random signed jwts, not user-chosen secrets,
+    so they need no memory-hard hash to resist guessing.
+    """
+    return hmac.new(TOKEN_DIGEST_KEY, token.encode(), hashlib.sha256).hexdigest()
+
+
+async def find_stored_token(table: sqlalchemy.Table, token: str, jti: str, *where):
+    """
+    the row of table holding token, or None.
+
+    rows are looked up by digest. rows written before digests were introduced
+    hold an argon2 hash instead and are found by jti and checked the slow way;
+    callers rewrite them as digests on rotation or delete them on use.
+    """
+    digest = token_digest(token)
+    digest_query = sqlalchemy.select(table).where(table.c.hashed_token == digest, *where)
+    row = await database.fetch_one(digest_query)
+    if row is not None and hmac.compare_digest(row.hashed_token, digest):
+        return row
+
+    legacy_query = sqlalchemy.select(table).where(table.c.jti == jti, *where)
+    row = await database.fetch_one(legacy_query)
+    if (
+        row is not None
+        and row.hashed_token.startswith(LEGACY_TOKEN_HASH_PREFIX)
+        and await verify_password(token, row.hashed_token)
+    ):
+        logger.debug(f"matched legacy argon2 hash in {table.name}")
+        return row
+    return None
 
 
 async def store_password_reset_token(email: str, reset_token: str, jti: str) -> None:
-    hashed_reset_token = await get_password_hash(reset_token)
+    hashed_reset_token = token_digest(reset_token)
     delete_existing = password_reset_table.delete().where(
         password_reset_table.c.user_email == email
     )
     await database.execute(delete_existing)
     insert_query = password_reset_table.insert().values(
-        jti=jti, user_email=email, hashed_token=hashed_reset_token
+        jti=jti,
+        user_email=email,
+        hashed_token=hashed_reset_token,
+        expires_at=password_reset_token_expires_at(),
     )
     await database.execute(insert_query)
 
@@ -195,39 +401,86 @@ async def validate_password_reset_token(reset_token: str) -> tuple[str, str]:
             detail="password reset token missing required fields",
         )
 
-    token_query = sqlalchemy.select(password_reset_table).where(
-        password_reset_table.c.jti == jti,
+    token_record = await find_stored_token(
+        password_reset_table,
+        reset_token,
+        jti,
         password_reset_table.c.user_email == email,
     )
-    token_record = await database.fetch_one(token_query)
     if not token_record:
         raise create_credentials_exception(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="password reset token not found",
         )
 
-    if not await verify_password(reset_token, token_record.hashed_token):
-        raise create_credentials_exception(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="invalid password reset token",
-        )
-
     return email, jti
 
 
 def decrypt_access_token(access_token: str):
-    return jwt.decode(access_token, key=SECRET_KEY, algorithms=[ALGORITHM])
+    return verify_token(access_token)
+
+
+async def run_password_hasher(func, *args):
+    try:
+        return await hash_executor.run(func, *args)
+    except HashExecutorBusy as e:
+        logger.warning(f"password hashing saturated: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        ) from e
+
+
+def configure_password_hasher() -> password_hashing.Argon2Parameters:
+    """
+    switch argon2 to ARGON2_TIME_COST and ARGON2_MEMORY_COST_KIB, measured once
+    with python -m foodapp.security.password_hashing; the library defaults
+    stay in place while they are unset
+    """
+    if config.ARGON2_TIME_COST and config.ARGON2_MEMORY_COST_KIB:
+        password_hashing.use_parameters(
+            password_hashing.Argon2Parameters(
+                config.ARGON2_TIME_COST,
+                config.ARGON2_MEMORY_COST_KIB,
+                config.ARGON2_PARALLELISM
+                or password_hashing.current_parameters().parallelism,
+            )
+        )
+        # process workers copy the parameters when they start
+        hash_executor.shutdown()
+    parameters = password_hashing.current_parameters()
+    logger.info(f"argon2 parameters: {parameters}")
+    return parameters
 
 
 async def get_password_hash(password: str) -> str:
-    return password_hasher.hash(password)
+    return await run_password_hasher(hash_password, password)
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    try:
-        return password_hasher.verify(hashed_password, plain_password)
-    except Exception:
-        return False
+    return await run_password_hasher(check_password, hashed_password, plain_password)
+
+
+async def rehash_password_if_needed(
+    email: str, plain_password: str, hashed_password: str
+) -> None:
+    """
+    after a successful login, rewrite a hash whose cost is off the current
+    parameters by more than ARGON2_REHASH_TOLERANCE; the plain password is only
+    available at this point
+    """
+    if not password_hashing.needs_rehash(
+        hashed_password, tolerance=config.ARGON2_REHASH_TOLERANCE
+    ):
+        return
+    new_hash = await get_password_hash(plain_password)
+    await database.execute(
+        user_table.update()
+        .where(user_table.c.email == email, user_table.c.password == hashed_password)
+        .values(password=new_hash)
+    )
+    logger.debug("rehashed password with current argon2 parameters")
 
 
 async def get_user(email: str):
@@ -238,7 +491,118 @@ async def get_user(email: str):
     return user
 
 
-async def authenticate_user(email: str, password: str):
+def remember_user(user) -> UserIdentity:
+    identity = UserIdentity(
+        id=user.id,
+        email=user.email,
+        confirmed=bool(user.confirmed),
+        token_version=user.token_version,
+    )
+    user_identity_cache.set(identity.email, identity)
+    token_versions.set(identity.email, identity.token_version)
+    return identity
+
+
+def forget_user(email: str) -> None:
+    user_identity_cache.invalidate(email)
+
+
+async def bump_token_version(email: str) -> None:
+    """
+    mark the claims in every access token issued to email so far as stale.
+    tokens checked by this worker fall back to the database straight away;
+    other workers notice once they read the user again, so changes that must
+    end access everywhere also call revoke_all_access_tokens.
+    """
+    version = await database.fetch_val(
+        user_table.update()
+        .where(user_table.c.email == email)
+        .values(token_version=user_table.c.token_version + 1)
+        .returning(user_table.c.token_version)
+    )
+    forget_user(email)
+    if version is not None:
+        now = time.monotonic()
+        for stale in [
+            known for known, (_, until) in bumped_token_versions.items() if until <= now
+        ]:
+            del bumped_token_versions[stale]
+        bumped_token_versions[email] = (
+            version,
+            now + access_token_expire_minutes() * 60,
+        )
+
+
+def known_token_version(email: str) -> int | None:
+    bumped = bumped_token_versions.get(email)
+    if bumped is not None and bumped[1] > time.monotonic():
+        return bumped[0]
+    return token_versions.get(email)
+
+
+async def revoke_all_access_tokens(email: str) -> None:
+    """
+    revoke every access token issued to email up to now, on every worker
+    """
+    await revocation_list.revoke_all(
+        email,
+        datetime.datetime.now(tz=datetime.UTC)
+        + datetime.timedelta(minutes=access_token_expire_minutes()),
+    )
+
+
+async def revoke_access_token(token: str) -> None:
+    claims = get_token_claims(token=token, type="access")
+    if "jti" not in claims:
+        # issued before tokens carried a jti, so the only way to revoke it is
+        # to revoke everything issued to its user
+        await revoke_all_access_tokens(claims["sub"])
+        return
+    await revocation_list.revoke(
+        claims["jti"], datetime.datetime.fromtimestamp(claims["exp"], tz=datetime.UTC)
+    )
+
+
+def identity_from_claims(claims: dict) -> UserIdentity | None:
+    """
+    the user an access token describes, or None when its claims are missing
+    (tokens issued before they were added) or older than the user's token
+    version as far as this worker knows
+    """
+    if "uid" not in claims or "ver" not in claims:
+        return None
+    known_version = known_token_version(claims["sub"])
+    if known_version is not None and claims["ver"] < known_version:
+        return None
+    return UserIdentity(
+        id=claims["uid"],
+        email=claims["sub"],
+        confirmed=bool(claims.get("confirmed")),
+        token_version=claims["ver"],
+    )
+
+
+async def get_user_identity(email: str) -> UserIdentity | None:
+    """
+    the columns authorization needs, without the password hash, from the
+    identity cache or one projected query
+    """
+    identity = user_identity_cache.get(email)
+    if identity is not None:
+        return identity
+    identity_query = sqlalchemy.select(
+        user_table.c.id,
+        user_table.c.email,
+        user_table.c.confirmed,
+        user_table.c.token_version,
+    ).where(user_table.c.email == email)
+    user = await database.fetch_one(identity_query)
+    if user is None:
+        return None
+    return remember_user(user)
+
+
+async def authenticate_user(email: str, password: str) -> UserIdentity:
     logger.debug("Authenticaling user", extra={"email": email})
     user = await get_user(email=email)
 
@@ -248,19 +612,26 @@ async def authenticate_user(email: str, password: str):
         plain_password=password, hashed_password=user.password
     ):
         raise create_credentials_exception("invalid email or password")
+    await rehash_password_if_needed(email, password, user.password)
 
     if not user.confirmed:
         raise create_credentials_exception(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="email is not confirmed"
         )
 
-    return user
+    return remember_user(user)
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> UserIdentity:
     logger.debug("Getting Current user with access token")
-    email = get_subject_token_type(token=token, type="access")
-    user = await get_user(email=email)
+    claims = get_token_claims(token=token, type="access")
+    if revocation_list.is_revoked(claims):
+        raise create_credentials_exception(detail="token has been revoked")
+    user = identity_from_claims(claims)
+    if user is None:
+        user = await get_user_identity(email=claims["sub"])
 
     if not user:
         raise create_credentials_exception(
@@ -270,9 +641,23 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     return user
 
 
+async def get_current_operator(
+    current_user: Annotated[UserIdentity, Depends(get_current_user)],
+) -> UserIdentity:
+    """
+    the current user, if it is a confirmed account listed in OPERATOR_EMAILS
+    """
+    if not current_user.confirmed or current_user.email not in operator_emails:
+        raise create_credentials_exception(
+            detail="operator access required",
+            status_code=status.HTTP_403_FORBIDDEN,
+        )
+    return current_user
+
+
 async def is_confirmed(email: str) -> bool:
-    user = await get_user(email)
-    return user.confirmed == True #noqa
+    user = await get_user_identity(email)
+    return user is not None and user.confirmed
 
 
 async def refresh_token_rotation(refresh_token: str):
@@ -302,40 +687,26 @@ async def refresh_token_rotation(refresh_token: str):
         )
     refresh_id = refresh_payload["jti"]
 
-    jti_query = sqlalchemy.select(refreshtoken_table).where(
-        refreshtoken_table.c.jti == refresh_id
+    token_content = await find_stored_token(
+        refreshtoken_table, refresh_token, refresh_id
     )
-    logger.debug(jti_query)
-
-    token_content = await database.fetch_one(jti_query)
     if not token_content:
         raise create_credentials_exception(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="refresh token no longer in database,please login again",
         )
-    try:
-        hashed_token = token_content.hashed_token
-        user_email = token_content.user_email
-    except Exception as e:
-        raise create_credentials_exception(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"refreshtoken_table object error: {e}",
-        )
-
-    if not await verify_password(refresh_token, hashed_token):
-        raise create_credentials_exception(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="wrong refresh token,please use correct token or login with your email and password",
-        )
+    user_email = token_content.user_email
 
-    new_access_token = create_access_token(email=user_email)
+    new_access_token = create_access_token(
+        email=user_email, user=await get_user_identity(user_email)
+    )
     new_refresh_token = create_refresh_token(email=user_email, jti=refresh_id)
-    new_hashed_token = await get_password_hash(new_refresh_token)
+    new_hashed_token = token_digest(new_refresh_token)
 
     update_token_query = (
         sqlalchemy.update(refreshtoken_table)
         .where(refreshtoken_table.c.jti == refresh_id)
-        .values(hashed_token=new_hashed_token)
+        .values(hashed_token=new_hashed_token, expires_at=refresh_token_expires_at())
     )
     logger.debug(update_token_query)
     try:
@@ -0,0 +1,150 @@
+"""
+bounded in-process LRU/TTL cache for serialized responses.
+
+entries carry tags (for example "post:7" or "feed:likes") so writers can drop
+exactly the responses their change touches instead of flushing everything.
+
+a reader that fills the cache takes generation() before its query and passes it
+to set(); if a writer invalidated any of the entry's tags in between, the query
+may predate the write and the entry is not stored.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    tags: frozenset = field(default_factory=frozenset)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._tags: dict[str, set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        # generation of the latest invalidation per tag; forgotten in bulk once
+        # it grows past max_invalidated_tags, after which fills that started
+        # before the bulk forget are refused
+        self.max_invalidated_tags = max(4 * max_entries, 1024)
+        self._generation = 0
+        self._generation_floor = 0
+        self._invalidated: dict[str, int] = {}
+
+    def generation(self) -> int:
+        """
+        take before running the query whose result is passed to set()
+        """
+        return self._generation
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: Iterable[str] = (),
+        ttl_seconds: float | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """
+        ttl_seconds shortens the cache-wide ttl for this entry, never extends it;
+        with generation, the entry is dropped if one of its tags was invalidated
+        since that generation was taken
+        """
+        if self.max_entries <= 0:
+            return
+        tags = frozenset(tags)
+        if generation is not None and self._invalidated_since(tags, generation):
+            self.stale_fills += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        ttl = self.ttl_seconds
+        if ttl_seconds is not None:
+            ttl = min(ttl, ttl_seconds)
+        if ttl <= 0:
+            return
+        entry = CacheEntry(value, time.monotonic() + ttl, tags)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_tag(self, tag: str) -> None:
+        self._generation += 1
+        if len(self._invalidated) >= self.max_invalidated_tags:
+            self._forget_invalidations()
+        self._invalidated[tag] = self._generation
+        for key in list(self._tags.get(tag, ())):
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self._forget_invalidations()
+
+    def _forget_invalidations(self) -> None:
+        self._invalidated.clear()
+        self._generation_floor = self._generation
+
+    def _invalidated_since(self, tags: frozenset, generation: int) -> bool:
+        if generation < self._generation_floor:
+            return True
+        return any(self._invalidated.get(tag, 0) > generation for tag in tags)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_fills": self.stale_fills,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
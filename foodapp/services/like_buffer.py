@@ -0,0 +1,155 @@
+"""
+write-behind buffer for likes.
+
+likes are validated and acknowledged by the router, then parked here as a
+de-duplicated set of (user_id, post_id) pairs. the pairs are handed to the
+flush callback in one batch when the buffer reaches flush_size, every
+flush_interval seconds, and once more on shutdown.
+
+a failed flush puts its pairs back, but marked: later flushes write marked
+pairs one at a time, apart from the batch, so one pair the database keeps
+rejecting can't hold the others back. a pair that has failed max_attempts
+times is dropped and counted, so the buffer can't grow without bound.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+LikePair = tuple[int, int]
+
+
+class LikeBuffer:
+    def __init__(
+        self,
+        flush: Callable[[list[LikePair]], Awaitable[int]],
+        flush_size: int = 500,
+        flush_interval: float = 1.0,
+        max_attempts: int = 5,
+    ) -> None:
+        self._flush = flush
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        # dict as an insertion-ordered set
+        self._pending: dict[LikePair, None] = {}
+        # failed writes so far of pending pairs that have failed before
+        self._attempts: dict[LikePair, int] = {}
+        self._lock = asyncio.Lock()
+        self._loop_task: asyncio.Task | None = None
+        self._size_task: asyncio.Task | None = None
+        self.accepted = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def add(self, user_id: int, post_id: int) -> bool:
+        """
+        queue a like; returns False when the same like is already waiting
+        """
+        pair = (user_id, post_id)
+        if pair in self._pending:
+            return False
+        self._pending[pair] = None
+        self.accepted += 1
+        if self.depth >= self.flush_size and not (
+            self._size_task and not self._size_task.done()
+        ):
+            self._size_task = asyncio.create_task(self.flush())
+        return True
+
+    async def discard(self, user_id: int, post_id: int) -> bool:
+        """
+        drop a like that hasn't been written yet; returns whether one was waiting.
+        waits for a flush in progress, so a like it already took is written
+        before the caller goes on to delete it
+        """
+        pair = (user_id, post_id)
+        async with self._lock:
+            self._attempts.pop(pair, None)
+            if pair not in self._pending:
+                return False
+            del self._pending[pair]
+            return True
+
+    def is_pending(self, user_id: int, post_id: int) -> bool:
+        return (user_id, post_id) in self._pending
+
+    async def _write(self, pairs: list[LikePair]) -> int | None:
+        """
+        the flush callback's result, or None after marking pairs as failed
+        """
+        try:
+            written = await self._flush(pairs)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception(f"like flush failed for {len(pairs)} likes")
+            requeued = []
+            for pair in pairs:
+                attempts = self._attempts.get(pair, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(pair, None)
+                    self.dropped += 1
+                    logger.warning(f"dropping like {pair} after {attempts} attempts")
+                else:
+                    self._attempts[pair] = attempts
+                    requeued.append(pair)
+            self._pending = {**dict.fromkeys(requeued), **self._pending}
+            return None
+        self.flushes += 1
+        self.flushed += len(pairs)
+        for pair in pairs:
+            self._attempts.pop(pair, None)
+        return written
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pairs, self._pending = list(self._pending), {}
+            fresh = [pair for pair in pairs if pair not in self._attempts]
+            batches = [fresh] if fresh else []
+            batches += [[pair] for pair in pairs if pair in self._attempts]
+            written = 0
+            for batch in batches:
+                written += await self._write(batch) or 0
+            logger.debug(f"flushed {len(pairs)} buffered likes, {written} new")
+            return written
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "flush_size": self.flush_size,
+            "flush_interval": self.flush_interval,
+            "accepted": self.accepted,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,25 @@
+"""
+time-decayed "hot" ranking for the post feed.
+
+a post's score is log10 of its engagement plus a term that grows linearly with
+its creation time. because the time term is fixed when the post is created,
+a stored score never goes stale: newer posts simply start higher, and a post
+needs 10x the engagement to keep up with one created HOT_DECAY_SECONDS later.
+that lets the score live in an indexed column that is only touched when a like
+or comment arrives, and the feed reads it like any other sort key.
+"""
+
+import datetime
+import math
+
+HOT_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+HOT_DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 2
+
+
+def hot_score(likes: int, comments: int, created_at: datetime.datetime) -> float:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.UTC)
+    engagement = max(likes + COMMENT_WEIGHT * comments, 1)
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return math.log10(engagement) + age / HOT_DECAY_SECONDS
@@ -0,0 +1,164 @@
+"""
+admission control for the password-checking endpoints.
+
+each attempt takes a token from two buckets, one per client ip and one per
+email, and holds one of max_concurrent slots while it hashes. an attempt that
+finds a bucket empty or every slot taken is refused with RateLimited before
+any argon2 work is done, so a burst of logins cannot starve other routes of
+cpu.
+
+bucket state lives behind RateLimitBackend. InMemoryRateLimitBackend keeps it
+per worker; a shared store (redis, the database) only has to implement take()
+for several workers to enforce one budget. the concurrency cap stays per
+worker on purpose: it protects the cpu of the process doing the hashing.
+
+behind a load balancer every connection comes from the balancer, so the ip
+bucket is keyed by client_ip(), which takes the client from X-Forwarded-For
+but only believes the hops added by configured trusted proxies.
+"""
+
+import ipaddress
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Protocol
+
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def parse_networks(value: str | None) -> list[IPNetwork]:
+    """
+    comma-separated addresses or CIDR ranges, e.g. "10.0.0.0/8, 192.168.1.7"
+    """
+    if not value:
+        return []
+    return [
+        ipaddress.ip_network(item.strip(), strict=False)
+        for item in value.split(",")
+        if item.strip()
+    ]
+
+
+def _is_trusted(address: str, trusted: list[IPNetwork]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_ip(peer: str, forwarded_for: str | None, trusted: list[IPNetwork]) -> str:
+    """
+    the address of the client behind any trusted proxies: walk X-Forwarded-For
+    from the nearest hop and stop at the first address no trusted proxy vouches
+    for. a client can prepend whatever it likes to the header, so hops further
+    out than that are ignored
+    """
+    if not forwarded_for or not _is_trusted(peer, trusted):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimited(Exception):
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimitBackend(Protocol):
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        take one token from the bucket at key, refilled at rate tokens per
+        second up to capacity. returns 0 when a token was taken, otherwise the
+        seconds until one will be available.
+        """
+        ...
+
+    def reset(self) -> None: ...
+
+
+class InMemoryRateLimitBackend:
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time they were counted at), least recently used first
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        # an evicted bucket comes back full, which only ever errs towards allowing
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+
+class LoginLimiter:
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        ip_rate_per_minute: float = 60.0,
+        ip_burst: int = 20,
+        email_rate_per_minute: float = 10.0,
+        email_burst: int = 10,
+        max_concurrent: int = 16,
+    ) -> None:
+        self.backend = backend
+        self.ip_rate = ip_rate_per_minute / 60
+        self.ip_burst = ip_burst
+        self.email_rate = email_rate_per_minute / 60
+        self.email_burst = email_burst
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {"ip": 0, "email": 0, "concurrency": 0}
+
+    def _reject(self, reason: str, retry_after: float) -> RateLimited:
+        self.rejected[reason] += 1
+        return RateLimited(reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, ip: str, email: str) -> AsyncIterator[None]:
+        if self.in_flight >= self.max_concurrent:
+            raise self._reject("concurrency", 1.0)
+        retry_after = await self.backend.take(f"ip:{ip}", self.ip_rate, self.ip_burst)
+        if retry_after:
+            raise self._reject("ip", retry_after)
+        retry_after = await self.backend.take(
+            f"email:{email.strip().lower()}", self.email_rate, self.email_burst
+        )
+        if retry_after:
+            raise self._reject("email", retry_after)
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def reset(self) -> None:
+        self.backend.reset()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
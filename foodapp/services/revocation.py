@@ -0,0 +1,166 @@
+"""
+in-memory view of revoked access tokens.
+
+the revoked_tokens table is the record; every worker keeps its rows in a set
+of revoked jtis and a dict of per-user revoke-all cutoffs, so checking a
+request is one set lookup (plus a dict lookup while any cutoff exists) and
+never a query. both are exact, so a hit needs no further check.
+
+revocations made by this worker apply at once. those made by other workers
+arrive with refresh(), which reads rows added since the last one it saw, every
+refresh_interval seconds; load() rebuilds everything from the table every
+rebuild_interval seconds to pick up rows a concurrent transaction committed
+out of id order. entries are dropped from memory once the tokens they cover
+have expired, in step with the sweeper deleting their rows.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    def __init__(
+        self,
+        database,
+        table: sqlalchemy.Table,
+        refresh_interval: float = 5.0,
+        rebuild_interval: float = 600.0,
+    ) -> None:
+        self.database = database
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        # jti -> expiry timestamp
+        self._jtis: dict[str, float] = {}
+        # email -> (revoked_at, expiry timestamp)
+        self._users: dict[str, tuple[float, float]] = {}
+        self._last_id = 0
+        self._task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.failed_refreshes = 0
+        self.revoked_hits = 0
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims.get("jti") in self._jtis:
+            self.revoked_hits += 1
+            return True
+        if self._users:
+            cutoff = self._users.get(claims.get("sub"))
+            if cutoff is not None and claims.get("iat", 0) <= cutoff[0]:
+                self.revoked_hits += 1
+                return True
+        return False
+
+    def _remember(self, key: str, revoked_at: float, expires_at: float) -> None:
+        kind, _, value = key.partition(":")
+        if kind == "jti":
+            self._jtis[value] = expires_at
+        elif kind == "user":
+            previous = self._users.get(value)
+            if previous is None or previous[0] < revoked_at:
+                self._users[value] = (revoked_at, expires_at)
+
+    async def _record(self, key: str, expires_at: datetime.datetime) -> None:
+        revoked_at = time.time()
+        await self.database.execute(
+            self.table.insert().values(
+                key=key, revoked_at=revoked_at, expires_at=expires_at
+            )
+        )
+        self._remember(key, revoked_at, expires_at.timestamp())
+
+    async def revoke(self, jti: str, expires_at: datetime.datetime) -> None:
+        """
+        revoke one access token until it would have expired anyway
+        """
+        await self._record(f"jti:{jti}", expires_at)
+
+    async def revoke_all(self, email: str, expires_at: datetime.datetime) -> None:
+        """
+        revoke every access token issued to email so far; expires_at must be
+        no earlier than the expiry of the newest of them
+        """
+        await self._record(f"user:{email}", expires_at)
+
+    def _apply_rows(self, rows) -> None:
+        for row in rows:
+            expires_at = row.expires_at
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=datetime.UTC)
+            self._remember(row.key, row.revoked_at, expires_at.timestamp())
+            self._last_id = max(self._last_id, row.id)
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+        self._users = {
+            email: cutoff for email, cutoff in self._users.items() if cutoff[1] > now
+        }
+
+    async def load(self) -> None:
+        now = datetime.datetime.now(tz=datetime.UTC)
+        rows = await self.database.fetch_all(
+            sqlalchemy.select(self.table).where(self.table.c.expires_at > now)
+        )
+        self._jtis, self._users = {}, {}
+        self._apply_rows(rows)
+        self.rebuilds += 1
+        logger.debug(f"loaded {len(rows)} token revocations")
+
+    async def refresh(self) -> None:
+        rows = await self.database.fetch_all(
+            sqlalchemy.select(self.table)
+            .where(self.table.c.id > self._last_id)
+            .order_by(self.table.c.id)
+        )
+        self._apply_rows(rows)
+        self._prune()
+        self.refreshes += 1
+
+    async def _refresh_periodically(self) -> None:
+        rebuilt_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if time.monotonic() - rebuilt_at >= self.rebuild_interval:
+                    await self.load()
+                    rebuilt_at = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception:
+                self.failed_refreshes += 1
+                logger.exception("refreshing token revocations failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self) -> None:
+        self._jtis, self._users = {}, {}
+        self._last_id = 0
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self._jtis),
+            "revoked_users": len(self._users),
+            "revoked_hits": self.revoked_hits,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+            "failed_refreshes": self.failed_refreshes,
+        }
@@ -0,0 +1,66 @@
+"""
+full-text search over post bodies.
+
+sqlite uses an external-content FTS5 table (posts_fts) ranked by bm25, postgres
+a generated tsvector column (posts.search_vector) with a GIN index ranked by
+ts_rank. both are created by migration 4 and kept in step with posts by the
+database itself (triggers / generated column), so every writer stays in sync.
+scores are normalised so higher is always better, which lets the router page
+results with the same (score, id) keyset on either backend.
+"""
+
+import re
+
+import sqlalchemy
+
+from foodapp.db.database import DATABASE_URL, post_table
+
+MAX_SEARCH_TERMS = 16
+USE_POSTGRES = "postgres" in DATABASE_URL
+
+posts_fts = sqlalchemy.table("posts_fts", sqlalchemy.column("rowid"))
+
+
+def search_terms(text: str) -> list[str]:
+    """
+    plain words only, so user input can never be parsed as FTS query syntax
+    """
+    return re.findall(r"\w+", text.lower())[:MAX_SEARCH_TERMS]
+
+
+def search_posts_query(terms: list[str], cursor: dict | None):
+    if USE_POSTGRES:
+        ts_query = sqlalchemy.func.plainto_tsquery("simple", " ".join(terms))
+        vector = sqlalchemy.literal_column("posts.search_vector")
+        score = sqlalchemy.func.ts_rank(vector, ts_query)
+        query = sqlalchemy.select(
+            post_table,
+            post_table.c.like_count.label("likes"),
+            score.label("score"),
+        ).where(vector.op("@@")(ts_query))
+    else:
+        fts = sqlalchemy.literal_column("posts_fts")
+        # bm25 is lower-is-better
+        score = -sqlalchemy.func.bm25(fts)
+        query = (
+            sqlalchemy.select(
+                post_table,
+                post_table.c.like_count.label("likes"),
+                score.label("score"),
+            )
+            .select_from(
+                posts_fts.join(post_table, post_table.c.id == posts_fts.c.rowid)
+            )
+            .where(fts.op("MATCH")(" ".join(f'"{term}"' for term in terms)))
+        )
+
+    if cursor:
+        query = query.where(
+            sqlalchemy.or_(
+                score < cursor["score"],
+                sqlalchemy.and_(
+                    score == cursor["score"], post_table.c.id < cursor["id"]
+                ),
+            )
+        )
+    return query.order_by(sqlalchemy.desc(score), sqlalchemy.desc(post_table.c.id))
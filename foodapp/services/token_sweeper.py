@@ -0,0 +1,103 @@
+"""
+background removal of expired refresh and reset tokens.
+
+every interval seconds the sweeper deletes rows whose expires_at has passed,
+batch_size rows per statement and with a pause between statements, so each
+delete holds its locks only briefly and foreground writes to the same tables
+get in between. it runs on the event loop of the worker that started it; when
+several workers sweep at once they only race to delete the same expired rows,
+which is harmless.
+"""
+
+import asyncio
+import datetime
+import logging
+
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+
+class TokenSweeper:
+    def __init__(
+        self,
+        database,
+        tables: list[sqlalchemy.Table],
+        batch_size: int = 500,
+        batch_pause: float = 0.1,
+        interval: float = 300.0,
+    ) -> None:
+        self.database = database
+        self.tables = tables
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        self.sweeps = 0
+        self.failed_sweeps = 0
+        self.removed = {table.name: 0 for table in tables}
+        self.last_removed = 0
+
+    async def _delete_batch(self, table: sqlalchemy.Table, now) -> int:
+        expired = (
+            sqlalchemy.select(table.c.id)
+            .where(table.c.expires_at < now)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        deleted = await self.database.fetch_all(
+            table.delete().where(table.c.id.in_(expired)).returning(table.c.id)
+        )
+        return len(deleted)
+
+    async def sweep(self) -> int:
+        """
+        delete every row that has expired by now; returns how many went
+        """
+        now = datetime.datetime.now(tz=datetime.UTC)
+        removed = 0
+        for table in self.tables:
+            while True:
+                deleted = await self._delete_batch(table, now)
+                self.removed[table.name] += deleted
+                removed += deleted
+                if deleted < self.batch_size:
+                    break
+                await asyncio.sleep(self.batch_pause)
+        self.sweeps += 1
+        self.last_removed = removed
+        if removed:
+            logger.info(f"swept {removed} expired tokens")
+        return removed
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                self.failed_sweeps += 1
+                logger.exception("token sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "interval": self.interval,
+            "sweeps": self.sweeps,
+            "failed_sweeps": self.failed_sweeps,
+            "last_removed": self.last_removed,
+            "removed": dict(self.removed),
+        }
@@ -0,0 +1,25 @@
+import hashlib
+
+
+def version_etag(*parts) -> str:
+    """
+    strong etag from cheap row-version data, e.g. (post_id, version)
+    """
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def rows_etag(rows) -> str:
+    """
+    strong etag for a list response from the (id, version) of every row in it
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for row in rows:
+        digest.update(f"{row.id}:{row.version};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
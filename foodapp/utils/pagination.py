@@ -0,0 +1,26 @@
+import base64
+import json
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    turn the keyset position of the last row on a page into an opaque token
+    that clients send back as ?cursor= to fetch the next page
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    the position encode_cursor produced; ValueError for a token that isn't
+    one, TypeError for one that doesn't hold a position
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("malformed cursor") from e
+    if not isinstance(position, dict):
+        raise TypeError("malformed cursor")
+    return position
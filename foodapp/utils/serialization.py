@@ -0,0 +1,30 @@
+"""
+fast JSON path for responses built from trusted database rows.
+
+the rows already match the response models column for column, so instead of
+validating every row into a pydantic model and encoding it, the fields the
+model declares are copied straight out of the row and written with orjson
+(falling back to the standard library when orjson isn't installed).
+"""
+
+import json
+from collections.abc import Iterable
+from typing import Any
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dump_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def rows_to_json(rows: Iterable, model: type[BaseModel]) -> bytes:
+    fields = tuple(model.model_fields)
+    return dump_json([{field: row[field] for field in fields} for row in rows])
@@ -23,6 +23,14 @@ os.environ["ENV_STATE"] = "test"  # hacking the env configuration durring testin
 
 from foodapp.main import app
 from foodapp.db.database import db_connection, user_table, init_db
+from foodapp.routers.post import response_cache
+from foodapp.routers.user import login_limiter
+from foodapp.security.user_security import (
+    bumped_token_versions,
+    revocation_list,
+    token_versions,
+    user_identity_cache,
+)
 
 database = db_connection()
 async def _clear_db() -> None:
@@ -34,6 +42,7 @@ async def _clear_db() -> None:
         await database.execute("DELETE FROM posts;")
         await database.execute("DELETE FROM refreshtokens;")
         await database.execute("DELETE FROM password_reset_tokens;")
+        await database.execute("DELETE FROM revoked_tokens;")
         await database.execute("DELETE FROM users;")
         seq_exists = await database.fetch_val(
             "SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';"
@@ -43,7 +52,7 @@ async def _clear_db() -> None:
         await database.execute("PRAGMA foreign_keys=ON;")
     else:
         await database.execute(
-            "TRUNCATE TABLE comments, likes, posts, refreshtokens, password_reset_tokens, users RESTART IDENTITY CASCADE;"
+            "TRUNCATE TABLE comments, likes, posts, refreshtokens, password_reset_tokens, revoked_tokens, users RESTART IDENTITY CASCADE;"
         )
 
 
@@ -62,6 +71,12 @@ async def db(anyio_backend) -> AsyncGenerator:
     await database.connect()
     init_db()
     await _clear_db()
+    response_cache.clear()
+    user_identity_cache.clear()
+    token_versions.clear()
+    bumped_token_versions.clear()
+    login_limiter.reset()
+    revocation_list.clear()
     yield
     await _clear_db()
     await database.disconnect()
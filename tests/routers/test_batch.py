@@ -0,0 +1,114 @@
+import pytest
+from httpx import AsyncClient
+
+from foodapp.db.database import comment_table, db_connection, like_table, post_table
+from tests.routers.test_post import create_post
+
+database = db_connection()
+
+
+async def send_batch(operations: list, client: AsyncClient, user_token: str):
+    return await client.post(
+        "/batch",
+        json={"operations": operations},
+        headers={"Authorization": f"Bearer {user_token}"},
+    )
+
+
+@pytest.mark.anyio
+async def test_batch_write_mixed_operations(
+    async_client: AsyncClient, logged_in_token: str
+):
+    post = await create_post("existing", async_client, logged_in_token)
+    response = await send_batch(
+        [
+            {"op": "post", "body": "offline post"},
+            {"op": "comment", "body": "offline comment", "post_id": post["id"]},
+            {"op": "like", "post_id": post["id"]},
+            {"op": "like", "post_id": post["id"]},
+            {"op": "like", "post_id": 999},
+        ],
+        async_client,
+        logged_in_token,
+    )
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [
+        "created",
+        "created",
+        "created",
+        "created",
+        "rejected",
+    ]
+
+    assert len(await database.fetch_all(post_table.select())) == 2
+    assert len(await database.fetch_all(comment_table.select())) == 1
+    # the repeated like is acknowledged but stored once
+    assert len(await database.fetch_all(like_table.select())) == 1
+    updated = await database.fetch_one(
+        post_table.select().where(post_table.c.id == post["id"])
+    )
+    assert (updated.like_count, updated.comment_count) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_batch_write_returns_created_ids(
+    async_client: AsyncClient, logged_in_token: str
+):
+    post = await create_post("existing", async_client, logged_in_token)
+    await send_batch([{"op": "like", "post_id": post["id"]}], async_client, logged_in_token)
+
+    response = await send_batch(
+        [
+            {"op": "post", "body": "first offline post"},
+            {"op": "comment", "body": "first", "post_id": post["id"]},
+            {"op": "post", "body": "second offline post"},
+            {"op": "comment", "body": "second", "post_id": post["id"]},
+            {"op": "like", "post_id": post["id"]},
+            {"op": "like", "post_id": 999},
+        ],
+        async_client,
+        logged_in_token,
+    )
+
+    ids = [item["id"] for item in response.json()]
+    posts = {
+        row.body: row.id for row in await database.fetch_all(post_table.select())
+    }
+    comments = {
+        row.body: row.id for row in await database.fetch_all(comment_table.select())
+    }
+    like = await database.fetch_one(like_table.select())
+    assert ids == [
+        posts["first offline post"],
+        comments["first"],
+        posts["second offline post"],
+        comments["second"],
+        like.id,
+        None,
+    ]
+
+
+@pytest.mark.anyio
+async def test_batch_write_requires_confirmed_user_for_posts(
+    async_client: AsyncClient, registered_user: dict
+):
+    login = await async_client.post(
+        "/login",
+        json={
+            "email": registered_user["email"],
+            "password": registered_user["password"],
+        },
+    )
+    token = login.json()["access token"]
+    response = await send_batch([{"op": "post", "body": "x"}], async_client, token)
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_batch_write_rejects_unknown_operation(
+    async_client: AsyncClient, logged_in_token: str
+):
+    response = await send_batch(
+        [{"op": "share", "post_id": 1}], async_client, logged_in_token
+    )
+    assert response.status_code == 422
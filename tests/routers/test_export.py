@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.dialects import postgresql
+
+from foodapp.routers.export import content_graph_query
+from foodapp.security import user_security
+from tests.routers.test_post import create_comment, create_post, like_post
+
+
+@pytest.fixture()
+def operator(mocker, confirmed_user: dict) -> dict:
+    mocker.patch.object(user_security, "operator_emails", {confirmed_user["email"]})
+    return confirmed_user
+
+
+@pytest.mark.anyio
+async def test_export_posts_streams_ndjson(
+    async_client: AsyncClient, operator: dict, logged_in_token: str
+):
+    first = await create_post("first", async_client, logged_in_token)
+    second = await create_post("second", async_client, logged_in_token)
+    await create_comment("c1", first["id"], async_client, logged_in_token)
+    await create_comment("c2", first["id"], async_client, logged_in_token)
+    await like_post(second["id"], async_client, logged_in_token)
+
+    response = await async_client.get(
+        "/export/posts", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [post["id"] for post in lines] == [first["id"], second["id"]]
+    assert [comment["body"] for comment in lines[0]["comments"]] == ["c1", "c2"]
+    assert lines[0]["liked_by"] == []
+    assert lines[1]["likes"] == 1
+    assert len(lines[1]["liked_by"]) == 1
+
+
+@pytest.mark.anyio
+async def test_export_posts_requires_auth(async_client: AsyncClient):
+    response = await async_client.get("/export/posts")
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_export_posts_forbidden_for_non_operators(
+    async_client: AsyncClient, logged_in_token: str
+):
+    response = await async_client.get(
+        "/export/posts", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_export_posts_forbidden_for_unconfirmed_operators(
+    async_client: AsyncClient, mocker, registered_user: dict
+):
+    mocker.patch.object(user_security, "operator_emails", {registered_user["email"]})
+    token = user_security.create_access_token(registered_user["email"])
+
+    response = await async_client.get(
+        "/export/posts", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 403
+
+
+def test_content_graph_query_binds_no_untyped_constants():
+    compiled = content_graph_query().compile(dialect=postgresql.dialect())
+    assert compiled.params == {}
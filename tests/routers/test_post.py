@@ -1,5 +1,17 @@
+from collections import Counter
 from httpx import AsyncClient
 import pytest
+from sqlalchemy.dialects import postgresql
+from foodapp.db.database import db_connection, post_table, comment_table, like_table
+from foodapp.routers.post import (
+    hot_score_update,
+    like_buffer,
+    per_post_increment,
+    response_cache,
+)
+from foodapp.core.config import config
+
+database = db_connection()
 
 
 async def create_post(body: str, client: AsyncClient, user_token: str) -> dict:
@@ -72,6 +84,33 @@ async def test_like_post(
     assert liked.status_code == 201
 
 
+@pytest.mark.anyio
+async def test_like_post_is_idempotent(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    first = await like_post(created_post["id"], async_client, logged_in_token)
+    again = await like_post(created_post["id"], async_client, logged_in_token)
+    assert first.json()["likes"] == again.json()["likes"] == 1
+    assert first.json()["id"] == again.json()["id"]
+    assert len(await database.fetch_all(like_table.select())) == 1
+
+
+@pytest.mark.anyio
+async def test_unlike_post(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    await like_post(created_post["id"], async_client, logged_in_token)
+    url = f"/like/{created_post['id']}"
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+
+    response = await async_client.delete(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["likes"] == 0
+    # unliking again is a no-op
+    assert (await async_client.delete(url, headers=headers)).json()["likes"] == 0
+    assert (await async_client.delete("/like/999", headers=headers)).status_code == 404
+
+
 @pytest.mark.anyio
 async def test_get_posts(async_client: AsyncClient, created_post: dict):
     response = await async_client.get("/posts")
@@ -136,3 +175,432 @@ async def test_get_post_with_comments(
     response = await async_client.get(f"/post/{created_post['id']}")
     assert response.status_code == 200
     # assert response.json() == {"post": created_post, "comment": [created_comment]}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "sorting,expected_pages",
+    [("new", [[5, 4], [3, 2], [1]]), ("old", [[1, 2], [3, 4], [5]])],
+)
+async def test_get_posts_cursor_pagination(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sorting: str,
+    expected_pages: list,
+):
+    for _ in range(5):
+        await create_post("test body", async_client, logged_in_token)
+
+    pages = []
+    params = {"sorting": sorting, "limit": 2}
+    while True:
+        response = await async_client.get("/posts", params=params)
+        assert response.status_code == 200
+        pages.append([post["id"] for post in response.json()])
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        params["cursor"] = next_cursor
+
+    assert pages == expected_pages
+
+
+@pytest.mark.anyio
+async def test_get_posts_cursor_pagination_by_likes(
+    async_client: AsyncClient, logged_in_token: str
+):
+    for _ in range(4):
+        await create_post("test body", async_client, logged_in_token)
+    await like_post(2, async_client, logged_in_token)
+    await like_post(4, async_client, logged_in_token)
+
+    # equal like counts fall back to newest first
+    first = await async_client.get("/posts", params={"sorting": "likes", "limit": 2})
+    assert [post["id"] for post in first.json()] == [4, 2]
+
+    second = await async_client.get(
+        "/posts",
+        params={
+            "sorting": "likes",
+            "limit": 2,
+            "cursor": first.headers["X-Next-Cursor"],
+        },
+    )
+    assert [post["id"] for post in second.json()] == [3, 1]
+    assert "X-Next-Cursor" not in second.headers
+
+
+@pytest.mark.anyio
+async def test_get_posts_rejects_foreign_cursor(
+    async_client: AsyncClient, logged_in_token: str
+):
+    await create_post("test body", async_client, logged_in_token)
+    await create_post("test body", async_client, logged_in_token)
+    response = await async_client.get("/posts", params={"sorting": "new", "limit": 1})
+
+    mismatched = await async_client.get(
+        "/posts",
+        params={"sorting": "likes", "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert mismatched.status_code == 400
+
+    garbage = await async_client.get("/posts", params={"cursor": "not-a-cursor"})
+    assert garbage.status_code == 400
+
+    not_a_position = await async_client.get("/posts", params={"cursor": "WzFd"})
+    assert not_a_position.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_like_and_comment_update_post_counters(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    await like_post(created_post["id"], async_client, logged_in_token)
+    await create_comment("nice", created_post["id"], async_client, logged_in_token)
+
+    response = await async_client.get(f"/post/{created_post['id']}/comments")
+    assert response.json()["post"]["likes"] == 1
+
+    post = await database.fetch_one(
+        post_table.select().where(post_table.c.id == created_post["id"])
+    )
+    assert (post.like_count, post.comment_count) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_delete_post_removes_likes_and_comments(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    await like_post(created_post["id"], async_client, logged_in_token)
+    await create_comment("nice", created_post["id"], async_client, logged_in_token)
+
+    response = await async_client.delete(
+        f"/post/{created_post['id']}",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == 200
+    assert await database.fetch_all(like_table.select()) == []
+    assert await database.fetch_all(comment_table.select()) == []
+
+
+@pytest.mark.anyio
+async def test_get_posts_hot_sorting(async_client: AsyncClient, logged_in_token: str):
+    for _ in range(3):
+        await create_post("test body", async_client, logged_in_token)
+    await like_post(1, async_client, logged_in_token)
+    # a comment weighs more than a like
+    await create_comment("nice", 2, async_client, logged_in_token)
+
+    # a single like is not enough to beat a newer post
+    first = await async_client.get("/posts", params={"sorting": "hot", "limit": 2})
+    assert [post["id"] for post in first.json()] == [2, 3]
+
+    second = await async_client.get(
+        "/posts",
+        params={"sorting": "hot", "cursor": first.headers["X-Next-Cursor"]},
+    )
+    assert [post["id"] for post in second.json()] == [1]
+
+
+@pytest.mark.anyio
+async def test_get_posts_served_from_cache_until_like(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    first = await async_client.get("/posts")
+    second = await async_client.get("/posts")
+    assert first.content == second.content
+    assert response_cache.stats()["hits"] == 1
+
+    await like_post(created_post["id"], async_client, logged_in_token)
+    response = await async_client.get("/posts")
+    assert response.json()[0]["likes"] == 1
+
+
+@pytest.mark.anyio
+async def test_update_comment_moves_counter_to_new_post(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    created_post: dict,
+    created_comment: dict,
+):
+    other_post = await create_post("other", async_client, logged_in_token)
+    before = await database.fetch_one(
+        post_table.select().where(post_table.c.id == other_post["id"])
+    )
+
+    response = await async_client.put(
+        "/comment",
+        json={**created_comment, "post_id": other_post["id"]},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+
+    assert response.status_code == 200
+    rows = await database.fetch_all(post_table.select().order_by(post_table.c.id))
+    assert [row.comment_count for row in rows] == [0, 1]
+    assert rows[1].hot_score > before.hot_score
+    comments = (await async_client.get(f"/post/{other_post['id']}/comments")).json()
+    assert [comment["id"] for comment in comments["comment"]] == [created_comment["id"]]
+
+
+@pytest.mark.anyio
+async def test_page_read_before_a_like_is_not_cached(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict, mocker
+):
+    fetch_all = database.fetch_all
+    liked = []
+
+    async def fetch_then_like(*args, **kwargs):
+        rows = await fetch_all(*args, **kwargs)
+        if not liked:
+            # the like commits and invalidates after the page query ran
+            liked.append(await like_post(created_post["id"], async_client, logged_in_token))
+        return rows
+
+    mocker.patch.object(database, "fetch_all", side_effect=fetch_then_like)
+    stale = await async_client.get("/posts")
+    assert stale.json()[0]["likes"] == 0
+
+    response = await async_client.get("/posts")
+    assert response.json()[0]["likes"] == 1
+    assert response_cache.stats()["stale_fills"] == 1
+
+
+@pytest.mark.anyio
+async def test_get_comments_cache_invalidated_by_comment(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    url = f"/post/{created_post['id']}/comments"
+    assert (await async_client.get(url)).json()["comment"] == []
+
+    await create_comment("fresh", created_post["id"], async_client, logged_in_token)
+    comments = (await async_client.get(url)).json()["comment"]
+    assert [comment["body"] for comment in comments] == ["fresh"]
+
+
+@pytest.mark.anyio
+async def test_metrics_exposes_post_cache_counters(async_client: AsyncClient):
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert {"hits", "misses", "evictions"} <= response.json()["post_cache"].keys()
+
+
+@pytest.mark.anyio
+async def test_get_post_conditional_get(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    url = f"/post/{created_post['id']}"
+    response = await async_client.get(url)
+    etag = response.headers["ETag"]
+
+    cached = await async_client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    await like_post(created_post["id"], async_client, logged_in_token)
+    changed = await async_client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("url", ["/posts", "/post/1/comments"])
+async def test_listing_conditional_get(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict, url: str
+):
+    etag = (await async_client.get(url)).headers["ETag"]
+
+    # once from the response cache, once revalidated against the database
+    assert (
+        await async_client.get(url, headers={"If-None-Match": etag})
+    ).status_code == 304
+    response_cache.clear()
+    assert (
+        await async_client.get(url, headers={"If-None-Match": etag})
+    ).status_code == 304
+
+    await create_comment("new", created_post["id"], async_client, logged_in_token)
+    await create_post("another", async_client, logged_in_token)
+    response = await async_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_get_comments_cursor_pagination(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict
+):
+    for index in range(5):
+        await create_comment(
+            f"comment {index}", created_post["id"], async_client, logged_in_token
+        )
+    url = f"/post/{created_post['id']}/comments"
+
+    pages = []
+    params = {"limit": 2}
+    while True:
+        response = await async_client.get(url, params=params)
+        assert response.status_code == 200
+        assert response.json()["post"]["id"] == created_post["id"]
+        pages.append([comment["body"] for comment in response.json()["comment"]])
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert pages == [
+        ["comment 0", "comment 1"],
+        ["comment 2", "comment 3"],
+        ["comment 4"],
+    ]
+
+
+@pytest.mark.anyio
+async def test_get_comments_missing_post(async_client: AsyncClient):
+    response = await async_client.get("/post/42/comments")
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_search_posts(async_client: AsyncClient, logged_in_token: str):
+    await create_post("cheap pizza deal downtown", async_client, logged_in_token)
+    await create_post("sushi night", async_client, logged_in_token)
+    await create_post("pizza pizza pizza", async_client, logged_in_token)
+
+    response = await async_client.get("/posts/search", params={"q": "Pizza"})
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [3, 1]
+
+    response = await async_client.get("/posts/search", params={"q": "pizza deal"})
+    assert [post["id"] for post in response.json()] == [1]
+
+    # query syntax characters are treated as plain text
+    response = await async_client.get("/posts/search", params={"q": 'sushi" (*'})
+    assert [post["id"] for post in response.json()] == [2]
+
+
+@pytest.mark.anyio
+async def test_search_posts_pagination_and_delete(
+    async_client: AsyncClient, logged_in_token: str
+):
+    for _ in range(3):
+        await create_post("burger", async_client, logged_in_token)
+
+    first = await async_client.get("/posts/search", params={"q": "burger", "limit": 2})
+    second = await async_client.get(
+        "/posts/search",
+        params={"q": "burger", "cursor": first.headers["X-Next-Cursor"]},
+    )
+    ids = [post["id"] for post in first.json() + second.json()]
+    assert sorted(ids) == [1, 2, 3]
+
+    await async_client.delete(
+        "/post/2", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    response = await async_client.get("/posts/search", params={"q": "burger"})
+    assert 2 not in [post["id"] for post in response.json()]
+
+
+@pytest.mark.anyio
+async def test_get_user_posts(
+    async_client: AsyncClient, logged_in_token: str, confirmed_user: dict
+):
+    for _ in range(3):
+        await create_post("test body", async_client, logged_in_token)
+    await like_post(2, async_client, logged_in_token)
+    url = f"/user/{confirmed_user['id']}/posts"
+
+    first = await async_client.get(url, params={"limit": 2})
+    assert [(post["id"], post["likes"]) for post in first.json()] == [(3, 0), (2, 1)]
+    second = await async_client.get(
+        url, params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}
+    )
+    assert [post["id"] for post in second.json()] == [1]
+
+    other = await async_client.get(f"/user/{confirmed_user['id'] + 1}/posts")
+    assert other.json() == []
+
+
+@pytest.mark.anyio
+async def test_like_post_write_behind(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict, mocker
+):
+    mocker.patch.object(config, "LIKE_WRITE_BEHIND", True)
+    response = await like_post(created_post["id"], async_client, logged_in_token)
+    assert response.status_code == 202
+    await like_post(created_post["id"], async_client, logged_in_token)
+    assert like_buffer.depth == 1
+    assert (await async_client.get("/metrics")).json()["like_buffer"]["depth"] == 1
+
+    assert await like_buffer.flush() == 1
+    post = await database.fetch_one(
+        post_table.select().where(post_table.c.id == created_post["id"])
+    )
+    assert post.like_count == 1
+    assert len(await database.fetch_all(like_table.select())) == 1
+
+
+@pytest.mark.anyio
+async def test_buffered_like_of_deleted_user_is_skipped(
+    async_client: AsyncClient, logged_in_token: str, created_post: dict, mocker
+):
+    mocker.patch.object(config, "LIKE_WRITE_BEHIND", True)
+    await like_post(created_post["id"], async_client, logged_in_token)
+    like_buffer.add(created_post["user_id"] + 1000, created_post["id"])
+
+    assert await like_buffer.flush() == 1
+    assert like_buffer.depth == 0
+    assert len(await database.fetch_all(like_table.select())) == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("url", ["/posts", "/post/1/comments", "/posts/search?q=test"])
+async def test_fast_serialization_matches_model_serialization(
+    async_client: AsyncClient,
+    created_post: dict,
+    created_comment: dict,
+    url: str,
+    mocker,
+):
+    fast = await async_client.get(url)
+    response_cache.clear()
+    mocker.patch.object(config, "FAST_SERIALIZATION", False)
+    validated = await async_client.get(url)
+    assert fast.json() == validated.json()
+    assert fast.content == validated.content
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("fast", [True, False])
+async def test_get_posts_by_ids(
+    async_client: AsyncClient, logged_in_token: str, fast: bool, mocker
+):
+    mocker.patch.object(config, "FAST_SERIALIZATION", fast)
+    for _ in range(3):
+        await create_post("test body", async_client, logged_in_token)
+    await like_post(3, async_client, logged_in_token)
+
+    response = await async_client.get("/posts/multi", params={"ids": [3, 99, 1]})
+    assert response.status_code == 200
+    items = response.json()
+    assert [(item["id"], item["found"]) for item in items] == [
+        (3, True),
+        (99, False),
+        (1, True),
+    ]
+    assert items[0]["post"]["likes"] == 1
+    assert items[1]["post"] is None
+
+
+@pytest.mark.anyio
+async def test_get_posts_by_ids_limits_list(async_client: AsyncClient):
+    response = await async_client.get("/posts/multi", params={"ids": list(range(101))})
+    assert response.status_code == 422
+
+
+def test_counter_and_hot_score_updates_cast_their_case_branches():
+    counters = post_table.update().values(
+        like_count=per_post_increment(post_table.c.like_count, Counter({1: 2, 3: -1}))
+    )
+    sql = str(counters.compile(dialect=postgresql.dialect()))
+    assert sql.count("AS INTEGER)") == 3
+
+    sql = str(hot_score_update({1: 1.5, 2: 0.5}).compile(dialect=postgresql.dialect()))
+    assert sql.count("AS FLOAT)") == 2
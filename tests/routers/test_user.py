@@ -2,6 +2,8 @@ from httpx import AsyncClient
 import pytest
 from foodapp.utils.formatted_printer import print_better
 from fastapi import Request
+from foodapp.routers import user as user_router
+from foodapp.services.rate_limit import parse_networks
 
 
 async def register_user(async_client: AsyncClient, email: str, password: str):
@@ -98,3 +100,43 @@ async def test_login_user_exists(async_client: AsyncClient, confirmed_user: dict
         },
     )
     assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_login_rate_limited_before_hashing(
+    async_client: AsyncClient, confirmed_user: dict, mocker
+):
+    mocker.patch.object(user_router.login_limiter, "email_burst", 2)
+    verify = mocker.spy(user_router, "verify_password")
+    credentials = {"email": confirmed_user["email"], "password": "wrong"}
+
+    statuses = [
+        (await async_client.post("/login", json=credentials)).status_code
+        for _ in range(3)
+    ]
+    response = await async_client.post("/token", json=credentials)
+
+    assert statuses == [404, 404, 429]
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert verify.call_count == 2
+
+
+@pytest.mark.anyio
+async def test_login_ip_limit_keyed_by_forwarded_client(
+    async_client: AsyncClient, confirmed_user: dict, mocker
+):
+    mocker.patch.object(user_router, "trusted_proxies", parse_networks("127.0.0.1"))
+    mocker.patch.object(user_router.login_limiter, "ip_burst", 1)
+    credentials = {"email": confirmed_user["email"], "password": "wrong"}
+
+    statuses = [
+        (
+            await async_client.post(
+                "/login", json=credentials, headers={"X-Forwarded-For": client}
+            )
+        ).status_code
+        for client in ("198.51.100.1", "198.51.100.2", "198.51.100.1")
+    ]
+
+    assert statuses == [404, 404, 429]
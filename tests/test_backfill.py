@@ -0,0 +1,49 @@
+"""
+tests for the one-off counter back-fill in foodapp.db.backfill
+"""
+
+import pytest
+
+from foodapp.db import backfill
+from foodapp.db.database import (
+    comment_table,
+    db_connection,
+    engine,
+    like_table,
+    post_table,
+    user_table,
+)
+
+database = db_connection()
+
+
+@pytest.mark.anyio
+async def test_backfill_post_counters():
+    user_id = await database.execute(
+        user_table.insert().values(email="backfill@example.com", password="x")
+    )
+    post_id = await database.execute(
+        post_table.insert().values(body="old post", user_id=user_id)
+    )
+    for index in range(3):
+        liker_id = await database.execute(
+            user_table.insert().values(email=f"liker{index}@example.com", password="x")
+        )
+        await database.execute(
+            like_table.insert().values(post_id=post_id, user_id=liker_id)
+        )
+    await database.execute(
+        comment_table.insert().values(body="c", post_id=post_id, user_id=user_id)
+    )
+
+    with engine.begin() as connection:
+        backfill.add_missing_post_columns(connection)
+        assert backfill.remove_duplicate_likes(connection) == 0
+        assert backfill.backfill_post_counters(connection) == 1
+        assert backfill.backfill_hot_scores(connection) == 1
+
+    post = await database.fetch_one(
+        post_table.select().where(post_table.c.id == post_id)
+    )
+    assert (post.like_count, post.comment_count) == (3, 1)
+    assert post.hot_score > 0
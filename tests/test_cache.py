@@ -0,0 +1,82 @@
+"""
+tests for the in-process response cache in foodapp.services.cache
+"""
+
+from foodapp.services.cache import ResponseCache
+
+
+def test_cache_hit_and_miss_counters():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    assert cache.get("a") is None
+    cache.set("a", b"1")
+    assert cache.get("a") == b"1"
+    assert {"hits": 1, "misses": 1}.items() <= cache.stats().items()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire(mocker):
+    clock = mocker.patch("foodapp.services.cache.time.monotonic", return_value=100.0)
+    cache = ResponseCache(max_entries=2, ttl_seconds=5)
+    cache.set("a", b"1")
+    clock.return_value = 106.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_invalidate_tag_only_drops_tagged_keys():
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    cache.set("page-1", b"1", tags=["feed", "post:1"])
+    cache.set("page-2", b"2", tags=["feed", "post:2"])
+    cache.invalidate_tag("post:1")
+    assert cache.get("page-1") is None
+    assert cache.get("page-2") == b"2"
+
+
+def test_cache_entry_ttl_only_shortens(mocker):
+    clock = mocker.patch("foodapp.services.cache.time.monotonic", return_value=100.0)
+    cache = ResponseCache(max_entries=4, ttl_seconds=5)
+    cache.set("short", b"1", ttl_seconds=2)
+    cache.set("long", b"2", ttl_seconds=60)
+    cache.set("expired", b"3", ttl_seconds=-1)
+    clock.return_value = 103.0
+    assert cache.get("short") is None
+    assert cache.get("long") == b"2"
+    assert cache.get("expired") is None
+    clock.return_value = 106.0
+    assert cache.get("long") is None
+
+
+def test_cache_refuses_fill_invalidated_during_its_query():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    generation = cache.generation()
+    cache.invalidate_tag("post:1")
+
+    cache.set("page", b"stale", tags=["feed", "post:1"], generation=generation)
+    assert cache.get("page") is None
+    assert cache.stats()["stale_fills"] == 1
+
+    cache.set("page", b"fresh", tags=["feed", "post:1"], generation=cache.generation())
+    cache.set("other", b"1", tags=["post:2"], generation=generation)
+    assert cache.get("page") == b"fresh"
+    assert cache.get("other") == b"1"
+
+
+def test_cache_forgotten_invalidations_refuse_older_fills():
+    cache = ResponseCache(max_entries=1, ttl_seconds=60)
+    cache.max_invalidated_tags = 2
+    generation = cache.generation()
+    for post_id in range(3):
+        cache.invalidate_tag(f"post:{post_id}")
+
+    cache.set("page", b"1", tags=["post:9"], generation=generation)
+    assert cache.get("page") is None
@@ -0,0 +1,74 @@
+"""
+tests for the access token signing keys in foodapp.security.keyring
+"""
+
+import os
+
+import jwt
+import pytest
+
+from foodapp.security import keyring
+from foodapp.security.keyring import KeyRing, generate_key
+
+
+@pytest.mark.parametrize("kind,algorithm", [("ed25519", "EdDSA"), ("rsa", "RS256")])
+def test_jwks_key_verifies_signed_token(kind: str, algorithm: str):
+    key = generate_key(kind, kid="k1")
+    ring = KeyRing([key])
+    token = jwt.encode(
+        {"sub": "a@b.c"}, key.private_key, algorithm=algorithm, headers={"kid": "k1"}
+    )
+
+    (jwk,) = ring.jwks()["keys"]
+    public_key = jwt.PyJWK(jwk).key
+
+    assert jwk["kid"] == "k1" and jwk["alg"] == algorithm
+    assert "d" not in jwk
+    assert jwt.decode(token, public_key, algorithms=[algorithm])["sub"] == "a@b.c"
+
+
+def test_rotation_keeps_old_key_for_overlap_window(mocker):
+    clock = mocker.patch("foodapp.security.keyring.time.time", return_value=1000.0)
+    old = generate_key(kid="old")
+    ring = KeyRing([old], overlap_seconds=60)
+
+    ring.rotate(generate_key(kid="new"))
+
+    assert ring.signing_key.kid == "new"
+    assert ring.verification_key("old") is not None
+    assert {key["kid"] for key in ring.jwks()["keys"]} == {"old", "new"}
+
+    clock.return_value = 1061.0
+    assert ring.verification_key("old") is None
+    assert [key["kid"] for key in ring.jwks()["keys"]] == ["new"]
+    ring.prune()
+    assert ring.verification_key("old") is None
+
+
+def test_from_directory_signs_with_active_kid(tmp_path):
+    keyring.write_key(str(tmp_path), generate_key(kid="a"))
+    keyring.write_key(str(tmp_path), generate_key("rsa", kid="b"))
+
+    ring = KeyRing.from_directory(str(tmp_path), active_kid="a")
+
+    assert ring.signing_key.kid == "a"
+    assert ring.verification_key("b").algorithm == "RS256"
+    with pytest.raises(ValueError):
+        KeyRing.from_directory(str(tmp_path), active_kid="missing")
+
+
+def test_from_directory_retires_keys_older_than_the_active_one(tmp_path, mocker):
+    for kid, written_at in [("old", 1000.0), ("current", 2000.0), ("next", 3000.0)]:
+        path = keyring.write_key(str(tmp_path), generate_key(kid=kid))
+        os.utime(path, (written_at, written_at))
+    clock = mocker.patch("foodapp.security.keyring.time.time", return_value=2059.0)
+
+    ring = KeyRing.from_directory(
+        str(tmp_path), active_kid="current", overlap_seconds=60
+    )
+
+    assert ring.signing_key.kid == "current"
+    assert {key["kid"] for key in ring.jwks()["keys"]} == {"old", "current", "next"}
+    clock.return_value = 2061.0
+    assert ring.verification_key("old") is None
+    assert {key["kid"] for key in ring.jwks()["keys"]} == {"current", "next"}
@@ -0,0 +1,118 @@
+"""
+tests for the write-behind like buffer in foodapp.services.like_buffer
+"""
+
+import asyncio
+
+import pytest
+
+from foodapp.services.like_buffer import LikeBuffer
+
+
+class RecordingFlush:
+    def __init__(self, fail: bool = False, bad_pairs=()) -> None:
+        self.batches = []
+        self.fail = fail
+        self.bad_pairs = set(bad_pairs)
+
+    async def __call__(self, pairs):
+        if self.fail or self.bad_pairs & set(pairs):
+            raise RuntimeError("database down")
+        self.batches.append(pairs)
+        return len(pairs)
+
+
+@pytest.mark.anyio
+async def test_like_buffer_deduplicates_and_flushes():
+    flush = RecordingFlush()
+    buffer = LikeBuffer(flush, flush_size=100)
+    assert buffer.add(1, 10)
+    assert not buffer.add(1, 10)
+    buffer.add(2, 10)
+    assert buffer.depth == 2
+
+    assert await buffer.flush() == 2
+    assert flush.batches == [[(1, 10), (2, 10)]]
+    assert buffer.depth == 0
+
+
+@pytest.mark.anyio
+async def test_like_buffer_flushes_on_size():
+    flush = RecordingFlush()
+    buffer = LikeBuffer(flush, flush_size=2)
+    buffer.add(1, 10)
+    buffer.add(2, 10)
+    await asyncio.sleep(0)
+    assert flush.batches == [[(1, 10), (2, 10)]]
+
+
+@pytest.mark.anyio
+async def test_like_buffer_flushes_on_interval_and_stop():
+    flush = RecordingFlush()
+    buffer = LikeBuffer(flush, flush_size=100, flush_interval=0.01)
+    buffer.start()
+    buffer.add(1, 10)
+    await asyncio.sleep(0.05)
+    assert flush.batches == [[(1, 10)]]
+
+    buffer.add(2, 10)
+    await buffer.stop()
+    assert flush.batches[-1] == [(2, 10)]
+
+
+@pytest.mark.anyio
+async def test_like_buffer_requeues_failed_flush():
+    buffer = LikeBuffer(RecordingFlush(fail=True), flush_size=100)
+    buffer.add(1, 10)
+    assert await buffer.flush() == 0
+    assert buffer.is_pending(1, 10)
+    assert buffer.stats()["failed_flushes"] == 1
+
+
+@pytest.mark.anyio
+async def test_like_buffer_isolates_and_drops_failing_pairs():
+    flush = RecordingFlush(bad_pairs=[(9, 90)])
+    buffer = LikeBuffer(flush, flush_size=100, max_attempts=2)
+    buffer.add(1, 10)
+    buffer.add(9, 90)
+    assert await buffer.flush() == 0
+    assert buffer.depth == 2
+
+    # the pairs that failed together are retried one by one
+    assert await buffer.flush() == 1
+    assert flush.batches == [[(1, 10)]]
+    assert buffer.depth == 0
+    assert buffer.stats()["dropped"] == 1
+
+
+@pytest.mark.anyio
+async def test_like_buffer_discard():
+    buffer = LikeBuffer(RecordingFlush(), flush_size=100)
+    buffer.add(1, 10)
+    assert await buffer.discard(1, 10)
+    assert not await buffer.discard(1, 10)
+    assert buffer.depth == 0
+
+
+@pytest.mark.anyio
+async def test_like_buffer_discard_waits_for_running_flush():
+    written = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_flush(pairs):
+        await release.wait()
+        written.set()
+        return len(pairs)
+
+    buffer = LikeBuffer(slow_flush, flush_size=100)
+    buffer.add(1, 10)
+    flushing = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0)
+    discarding = asyncio.create_task(buffer.discard(1, 10))
+    await asyncio.sleep(0)
+    assert not discarding.done()
+
+    release.set()
+    assert not await discarding
+    assert written.is_set()
+    assert await flushing == 1
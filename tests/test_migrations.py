@@ -0,0 +1,161 @@
+"""
+tests for the versioned migrations in foodapp.db.migrations, including the query
+plans of hot-path lookups so that a missing index fails here and not in production
+"""
+
+import databases
+import pytest
+import sqlalchemy
+
+from foodapp.db import migrations
+from foodapp.db.database import engine
+from foodapp.models.post import PostLikeIn
+from foodapp.models.user import User
+from foodapp.routers import post as post_router
+from foodapp.services.ranking import HOT_EPOCH
+
+LEGACY_SCHEMA = [
+    (
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, "
+        "password VARCHAR NOT NULL, confirmed BOOLEAN)"
+    ),
+    (
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, body VARCHAR, "
+        "user_id INTEGER NOT NULL REFERENCES users (id), image_url VARCHAR)"
+    ),
+    (
+        "CREATE TABLE comments (id INTEGER PRIMARY KEY, body VARCHAR, "
+        "post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE, "
+        "user_id INTEGER NOT NULL REFERENCES users (id))"
+    ),
+    (
+        "CREATE TABLE likes (id INTEGER PRIMARY KEY, "
+        "user_id INTEGER NOT NULL REFERENCES users (id), "
+        "post_id INTEGER NOT NULL REFERENCES posts (id))"
+    ),
+    "INSERT INTO users (id, email, password, confirmed) VALUES (1, 'a@b.c', 'x', 1)",
+    "INSERT INTO posts (id, body, user_id) VALUES (1, 'old post', 1)",
+    "INSERT INTO likes (user_id, post_id) VALUES (1, 1), (1, 1)",
+    "INSERT INTO comments (body, post_id, user_id) VALUES ('c', 1, 1)",
+]
+
+
+def query_plan(sql: str) -> str:
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # tiny test tables would otherwise always be scanned sequentially
+            connection.execute(sqlalchemy.text("SET enable_seqscan = off"))
+            rows = connection.execute(sqlalchemy.text(f"EXPLAIN {sql}")).all()
+            return "\n".join(row[0] for row in rows)
+        rows = connection.execute(sqlalchemy.text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return "\n".join(row[-1] for row in rows)
+
+
+def test_migrate_is_up_to_date():
+    latest = migrations.MIGRATIONS[-1].version
+    assert migrations.migrate(engine) == latest
+    with engine.connect() as connection:
+        assert migrations.current_version(connection) == latest
+
+
+def create_legacy_database(path) -> sqlalchemy.Engine:
+    legacy = sqlalchemy.create_engine(f"sqlite:///{path}")
+    with legacy.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(sqlalchemy.text(statement))
+    return legacy
+
+
+def test_migrate_upgrades_legacy_database_in_place(tmp_path):
+    legacy = create_legacy_database(tmp_path / "legacy.db")
+
+    assert migrations.migrate(legacy) == migrations.MIGRATIONS[-1].version
+
+    with legacy.connect() as connection:
+        post = connection.execute(
+            sqlalchemy.text("SELECT like_count, comment_count, version FROM posts")
+        ).one()
+        likes = connection.execute(sqlalchemy.text("SELECT COUNT(*) FROM likes"))
+        indexes = {
+            index["name"]
+            for index in sqlalchemy.inspect(connection).get_indexes("refreshtokens")
+        }
+        token_version = connection.execute(
+            sqlalchemy.text("SELECT token_version FROM users")
+        ).scalar()
+    assert tuple(post) == (1, 1, 1)
+    assert token_version == 1
+    assert likes.scalar() == 1
+    assert {"ix_refreshtokens_jti", "ix_refreshtokens_user_email"} <= indexes
+    legacy.dispose()
+
+
+@pytest.mark.anyio
+async def test_posts_that_predate_created_at_can_be_liked(tmp_path, mocker):
+    path = tmp_path / "legacy.db"
+    legacy = create_legacy_database(path)
+    migrations.migrate(legacy)
+    with legacy.begin() as connection:
+        connection.execute(sqlalchemy.text("DELETE FROM likes"))
+        connection.execute(sqlalchemy.text("UPDATE posts SET like_count = 0"))
+    legacy.dispose()
+    legacy_database = databases.Database(f"sqlite:///{path}")
+    await legacy_database.connect()
+    mocker.patch.object(post_router, "database", legacy_database)
+
+    try:
+        liked = await post_router.like_post(
+            PostLikeIn(post_id=1), User(id=1, email="a@b.c")
+        )
+        created_at = await legacy_database.fetch_val(
+            "SELECT created_at FROM posts WHERE id = 1"
+        )
+    finally:
+        await legacy_database.disconnect()
+
+    assert liked["likes"] == 1
+    assert created_at.startswith(HOT_EPOCH.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+@pytest.mark.parametrize(
+    "sql,index",
+    [
+        ("SELECT * FROM comments WHERE post_id = 1", "ix_comments_post_id_id"),
+        ("SELECT * FROM likes WHERE post_id = 1", "ix_likes_post_id"),
+        (
+            "SELECT * FROM posts WHERE user_id = 1 ORDER BY id DESC LIMIT 50",
+            "ix_posts_user_id_id",
+        ),
+        ("SELECT * FROM refreshtokens WHERE jti = 'j'", "ix_refreshtokens_jti"),
+        (
+            "SELECT * FROM refreshtokens WHERE user_email = 'a@b.c'",
+            "ix_refreshtokens_user_email",
+        ),
+        (
+            "SELECT * FROM password_reset_tokens WHERE jti = 'j'",
+            "ix_password_reset_tokens_jti",
+        ),
+        (
+            "SELECT * FROM refreshtokens WHERE hashed_token = 'd'",
+            "ix_refreshtokens_hashed_token",
+        ),
+        (
+            "SELECT * FROM password_reset_tokens WHERE hashed_token = 'd'",
+            "ix_password_reset_tokens_hashed_token",
+        ),
+        (
+            "SELECT * FROM posts ORDER BY like_count DESC, id DESC LIMIT 50",
+            "ix_posts_like_count_id",
+        ),
+        (
+            "SELECT * FROM posts ORDER BY hot_score DESC, id DESC LIMIT 50",
+            "ix_posts_hot_score_id",
+        ),
+        (
+            "SELECT * FROM revoked_tokens WHERE expires_at > '2024-01-01'",
+            "ix_revoked_tokens_expires_at",
+        ),
+    ],
+)
+def test_hot_path_queries_use_index(sql: str, index: str):
+    assert index in query_plan(sql)
@@ -0,0 +1,59 @@
+"""
+tests for argon2 calibration in foodapp.security.password_hashing
+"""
+
+from foodapp.security import password_hashing
+from foodapp.security.password_hashing import Argon2Parameters
+
+
+def fake_measure(parameters: Argon2Parameters, rounds: int = 3) -> float:
+    # 10ms per pass over 64 MiB
+    return parameters.time_cost * parameters.memory_cost / 65536 * 0.01
+
+
+def test_calibrate_prefers_memory_then_adds_passes(mocker):
+    mocker.patch.object(password_hashing, "measure", side_effect=fake_measure)
+
+    assert password_hashing.calibrate(0.035) == Argon2Parameters(3, 65536, 1)
+    assert password_hashing.calibrate(0.004, min_memory_kib=8192) == (
+        Argon2Parameters(1, 16384, 1)
+    )
+
+
+def test_calibrate_never_goes_below_min_memory(mocker):
+    mocker.patch.object(password_hashing, "measure", side_effect=fake_measure)
+
+    assert password_hashing.calibrate(0.0001, min_memory_kib=19456) == (
+        Argon2Parameters(1, 19456, 1)
+    )
+
+
+def test_needs_rehash_follows_current_parameters():
+    original = password_hashing.current_parameters()
+    hashed = password_hashing.hash_password("password")
+    try:
+        password_hashing.use_parameters(original._replace(time_cost=1))
+        assert password_hashing.needs_rehash(hashed)
+        assert password_hashing.check_password(hashed, "password")
+    finally:
+        password_hashing.use_parameters(original)
+    assert not password_hashing.needs_rehash(hashed)
+
+
+def test_needs_rehash_tolerates_small_cost_differences():
+    original = password_hashing.current_parameters()
+    hashed = password_hashing.hash_password("password")
+    try:
+        # another replica calibrated one notch of memory lower
+        password_hashing.use_parameters(
+            original._replace(memory_cost=original.memory_cost * 4 // 5)
+        )
+        assert not password_hashing.needs_rehash(hashed, tolerance=0.5)
+        assert password_hashing.needs_rehash(hashed)
+
+        password_hashing.use_parameters(
+            original._replace(memory_cost=original.memory_cost * 2)
+        )
+        assert password_hashing.needs_rehash(hashed, tolerance=0.5)
+    finally:
+        password_hashing.use_parameters(original)
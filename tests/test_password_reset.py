@@ -83,3 +83,27 @@ async def test_reset_password_updates_password_and_revokes_tokens(
     )
     assert login_response.status_code == 200
     assert login_response.json().get("access_token")
+
+
+@pytest.mark.anyio
+async def test_reset_password_revokes_access_tokens(
+    confirmed_user: dict, logged_in_token: str, async_client: AsyncClient
+):
+    reset_id = str(uuid.uuid4())
+    reset_token = create_password_reset_token(
+        email=confirmed_user["email"], jti=reset_id
+    )
+    await store_password_reset_token(confirmed_user["email"], reset_token, reset_id)
+
+    await async_client.post(
+        "/password/reset",
+        json={"token": reset_token, "new_password": "newpass123"},
+    )
+
+    response = await async_client.post(
+        "/post",
+        json={"body": "after reset"},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == 401
+    assert response.json()["detail"] == "token has been revoked"
@@ -0,0 +1,17 @@
+import datetime
+
+from foodapp.services.ranking import HOT_DECAY_SECONDS, hot_score
+
+
+def test_hot_score_grows_with_engagement():
+    now = datetime.datetime.now(tz=datetime.UTC)
+    assert hot_score(10, 0, now) > hot_score(1, 0, now)
+    assert hot_score(0, 1, now) > hot_score(1, 0, now)
+
+
+def test_hot_score_decays_with_age():
+    now = datetime.datetime.now(tz=datetime.UTC)
+    older = now - datetime.timedelta(seconds=HOT_DECAY_SECONDS)
+    # a post one decay period older needs 10x the engagement to tie
+    assert abs(hot_score(10, 0, older) - hot_score(1, 0, now)) < 1e-6
+    assert hot_score(0, 0, now.replace(tzinfo=None)) == hot_score(0, 0, now)
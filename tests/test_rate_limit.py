@@ -0,0 +1,80 @@
+"""
+tests for the login admission control in foodapp.services.rate_limit
+"""
+
+import pytest
+
+from foodapp.services.rate_limit import (
+    InMemoryRateLimitBackend,
+    LoginLimiter,
+    RateLimited,
+    client_ip,
+    parse_networks,
+)
+
+
+@pytest.mark.anyio
+async def test_bucket_refills_over_time(mocker):
+    clock = mocker.patch(
+        "foodapp.services.rate_limit.time.monotonic", return_value=100.0
+    )
+    backend = InMemoryRateLimitBackend()
+
+    assert await backend.take("k", rate=1.0, capacity=2) == 0
+    assert await backend.take("k", rate=1.0, capacity=2) == 0
+    assert await backend.take("k", rate=1.0, capacity=2) == pytest.approx(1.0)
+    clock.return_value = 101.0
+    assert await backend.take("k", rate=1.0, capacity=2) == 0
+
+
+@pytest.mark.anyio
+async def test_backend_evicts_least_recently_used_bucket():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        await backend.take(key, rate=1.0, capacity=1)
+
+    assert await backend.take("a", rate=1.0, capacity=1) == 0
+    assert await backend.take("c", rate=1.0, capacity=1) > 0
+
+
+@pytest.mark.anyio
+async def test_limiter_keys_by_email_across_ips():
+    limiter = LoginLimiter(InMemoryRateLimitBackend(), email_burst=2)
+    for ip in ("10.0.0.1", "10.0.0.2"):
+        async with limiter.admit(ip, "Victim@Example.com"):
+            pass
+
+    with pytest.raises(RateLimited) as exc_info:
+        async with limiter.admit("10.0.0.3", "victim@example.com"):
+            pass
+    assert exc_info.value.reason == "email"
+    assert limiter.stats()["rejected"]["email"] == 1
+
+
+@pytest.mark.anyio
+async def test_limiter_caps_concurrent_checks():
+    limiter = LoginLimiter(InMemoryRateLimitBackend(), max_concurrent=1)
+    async with limiter.admit("10.0.0.1", "a@example.com"):
+        with pytest.raises(RateLimited) as exc_info:
+            async with limiter.admit("10.0.0.2", "b@example.com"):
+                pass
+    assert exc_info.value.reason == "concurrency"
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize(
+    "peer,forwarded_for,expected",
+    [
+        # straight from the client: the header is whatever it chose to send
+        ("203.0.113.9", "198.51.100.1", "203.0.113.9"),
+        ("10.0.0.5", None, "10.0.0.5"),
+        ("10.0.0.5", "198.51.100.1", "198.51.100.1"),
+        # a spoofed entry in front of the real client is ignored
+        ("10.0.0.5", "1.2.3.4, 198.51.100.1, 10.0.0.7", "198.51.100.1"),
+        ("10.0.0.5", "10.0.0.7", "10.0.0.7"),
+    ],
+)
+def test_client_ip_trusts_only_configured_proxies(peer, forwarded_for, expected):
+    trusted = parse_networks("10.0.0.0/8, 192.168.1.7")
+    assert client_ip(peer, forwarded_for, trusted) == expected
+
@@ -0,0 +1,95 @@
+"""
+tests for access token revocation: /logout, /logout/all and the in-memory
+revocation list in foodapp.services.revocation
+"""
+
+import datetime
+
+import pytest
+from httpx import AsyncClient
+
+from foodapp.db.database import db_connection, refreshtoken_table, revoked_token_table
+from foodapp.security.user_security import get_token_claims, revocation_list
+from foodapp.services.revocation import RevocationList
+
+database = db_connection()
+
+
+async def login(async_client: AsyncClient, user: dict) -> str:
+    response = await async_client.post(
+        "/login", json={"email": user["email"], "password": user["password"]}
+    )
+    return response.json()["access token"]
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.anyio
+async def test_logout_revokes_only_that_token(
+    async_client: AsyncClient, confirmed_user: dict
+):
+    token = await login(async_client, confirmed_user)
+    other_token = await login(async_client, confirmed_user)
+
+    response = await async_client.post("/logout", headers=bearer(token))
+
+    assert response.status_code == 200
+    assert await database.fetch_all(refreshtoken_table.select()) == []
+    response = await async_client.post("/logout", headers=bearer(token))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "token has been revoked"
+    response = await async_client.post("/logout", headers=bearer(other_token))
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_logout_all_revokes_every_earlier_token(
+    async_client: AsyncClient, confirmed_user: dict
+):
+    tokens = [await login(async_client, confirmed_user) for _ in range(2)]
+
+    response = await async_client.post("/logout/all", headers=bearer(tokens[0]))
+
+    assert response.status_code == 200
+    for token in tokens:
+        response = await async_client.post("/logout", headers=bearer(token))
+        assert response.status_code == 401
+    new_token = await login(async_client, confirmed_user)
+    response = await async_client.post("/logout", headers=bearer(new_token))
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_refresh_picks_up_revocations_from_other_workers(
+    async_client: AsyncClient, confirmed_user: dict
+):
+    claims = get_token_claims(await login(async_client, confirmed_user), "access")
+    other_worker = RevocationList(database, revoked_token_table)
+    expires_at = datetime.datetime.fromtimestamp(claims["exp"], tz=datetime.UTC)
+
+    await other_worker.revoke(claims["jti"], expires_at)
+
+    assert not revocation_list.is_revoked(claims)
+    await revocation_list.refresh()
+    assert revocation_list.is_revoked(claims)
+
+
+@pytest.mark.anyio
+async def test_expired_revocations_are_dropped():
+    revocations = RevocationList(database, revoked_token_table)
+    now = datetime.datetime.now(tz=datetime.UTC)
+    await revocations.revoke("live", now + datetime.timedelta(minutes=5))
+    await revocations.revoke("expired", now - datetime.timedelta(seconds=1))
+    await revocations.revoke_all("user@example.net", now - datetime.timedelta(seconds=1))
+
+    await revocations.refresh()
+
+    assert revocations.stats()["revoked_tokens"] == 1
+    assert revocations.stats()["revoked_users"] == 0
+    assert revocations.is_revoked({"jti": "live", "sub": "user@example.net"})
+
+    await revocations.load()
+    assert revocations.stats()["revoked_tokens"] == 1
+    assert not revocations.is_revoked({"jti": "expired", "sub": "user@example.net"})
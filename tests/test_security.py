@@ -2,8 +2,24 @@
 This module is dedicated to test methods in user_security under security package
 """
 
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+
 import pytest
-from foodapp.security import user_security
+from argon2 import PasswordHasher
+from cryptography.hazmat.primitives import serialization
+from foodapp.security import password_hashing, user_security
+from foodapp.security.keyring import KeyRing, generate_key
+from foodapp.security.password_hashing import (
+    HashExecutor,
+    HashExecutorBusy,
+    check_password,
+    hash_password,
+)
 import jwt
 
 
@@ -154,3 +170,495 @@ async def get_current_user_wrong_token_type(registered_user: dict):
     token = user_security.create_confirm_token(registered_user["email"])
     with pytest.raises(user_security.HTTPException):
         await user_security.get_current_user(token)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+@pytest.mark.anyio
+async def test_concurrent_logins_do_not_block_event_loop(
+    async_client, confirmed_user: dict
+):
+    started = time.perf_counter()
+    hash_password("calibration")
+    one_hash = time.perf_counter() - started
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    responses = await asyncio.gather(
+        *(
+            async_client.post(
+                "/login",
+                json={
+                    "email": confirmed_user["email"],
+                    "password": confirmed_user["password"],
+                },
+            )
+            for _ in range(8)
+        )
+    )
+    stop.set()
+    worst_lag = await lag_task
+
+    assert all(response.status_code == 200 for response in responses)
+    # inline argon2 would stall the loop for several hashes back to back
+    assert worst_lag < max(2 * one_hash, 0.05)
+
+
+@pytest.mark.anyio
+async def test_hash_executor_rejects_beyond_max_pending():
+    executor = HashExecutor(workers=1, max_pending=1)
+
+    async def occupy():
+        return await executor.run(time.sleep, 0.2)
+
+    first = asyncio.create_task(occupy())
+    await asyncio.sleep(0)
+    with pytest.raises(HashExecutorBusy):
+        await executor.run(hash_password, "password")
+    await first
+
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["pending"] == 0
+    executor.shutdown()
+
+
+@pytest.mark.anyio
+async def test_busy_hash_executor_returns_503(async_client, confirmed_user, mocker):
+    mocker.patch.object(user_security.hash_executor, "max_pending", 0)
+    response = await async_client.post(
+        "/login",
+        json={"email": confirmed_user["email"], "password": confirmed_user["password"]},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+@pytest.mark.anyio
+async def test_hash_executor_process_pool():
+    executor = HashExecutor(workers=1, processes=True)
+    try:
+        hashed = await executor.run(hash_password, "password")
+        assert await executor.run(check_password, hashed, "password")
+        assert not await executor.run(check_password, hashed, "wrong")
+    finally:
+        executor.shutdown()
+
+
+async def stored_refresh_token(email: str):
+    query = user_security.refreshtoken_table.select().where(
+        user_security.refreshtoken_table.c.user_email == email
+    )
+    return await user_security.database.fetch_one(query)
+
+
+@pytest.mark.anyio
+async def test_refresh_tokens_are_stored_as_digests(registered_user: dict):
+    row = await stored_refresh_token(registered_user["email"])
+    refresh_token = user_security.create_refresh_token(
+        registered_user["email"], row.jti
+    )
+    await user_security.database.execute(
+        user_security.refreshtoken_table.update()
+        .where(user_security.refreshtoken_table.c.jti == row.jti)
+        .values(hashed_token=user_security.token_digest(refresh_token))
+    )
+
+    rotated = await user_security.refresh_token_rotation(refresh_token)
+
+    row = await stored_refresh_token(registered_user["email"])
+    assert row.hashed_token == user_security.token_digest(
+        rotated["new_refresh_token"]
+    )
+
+
+@pytest.mark.anyio
+async def test_legacy_argon2_refresh_token_is_upgraded_on_rotation(
+    registered_user: dict,
+):
+    row = await stored_refresh_token(registered_user["email"])
+    refresh_token = user_security.create_refresh_token(
+        registered_user["email"], row.jti
+    )
+    await user_security.database.execute(
+        user_security.refreshtoken_table.update()
+        .where(user_security.refreshtoken_table.c.jti == row.jti)
+        .values(hashed_token=hash_password(refresh_token))
+    )
+
+    rotated = await user_security.refresh_token_rotation(refresh_token)
+
+    row = await stored_refresh_token(registered_user["email"])
+    assert not row.hashed_token.startswith(user_security.LEGACY_TOKEN_HASH_PREFIX)
+    assert row.hashed_token == user_security.token_digest(
+        rotated["new_refresh_token"]
+    )
+
+
+@pytest.mark.anyio
+async def test_legacy_argon2_reset_token_still_validates(registered_user: dict):
+    email = registered_user["email"]
+    reset_token = user_security.create_password_reset_token(email, "reset-jti")
+    await user_security.database.execute(
+        user_security.password_reset_table.insert().values(
+            jti="reset-jti", user_email=email, hashed_token=hash_password(reset_token)
+        )
+    )
+
+    assert await user_security.validate_password_reset_token(reset_token) == (
+        email,
+        "reset-jti",
+    )
+
+
+@pytest.mark.anyio
+async def test_refresh_rotation_skips_argon2(registered_user: dict, mocker):
+    row = await stored_refresh_token(registered_user["email"])
+    refresh_token = user_security.create_refresh_token(
+        registered_user["email"], row.jti
+    )
+    await user_security.database.execute(
+        user_security.refreshtoken_table.update()
+        .where(user_security.refreshtoken_table.c.jti == row.jti)
+        .values(hashed_token=user_security.token_digest(refresh_token))
+    )
+    run = mocker.spy(user_security.hash_executor, "run")
+
+    await user_security.refresh_token_rotation(refresh_token)
+
+    run.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_get_current_user_is_cached_without_password(
+    registered_user: dict, mocker
+):
+    token = user_security.create_access_token(registered_user["email"])
+    fetch_one = mocker.spy(user_security.database, "fetch_one")
+
+    first = await user_security.get_current_user(token)
+    second = await user_security.get_current_user(token)
+
+    assert fetch_one.call_count == 1
+    assert first == second
+    assert first.model_dump() == {
+        "id": registered_user["id"],
+        "email": registered_user["email"],
+        "confirmed": False,
+        "token_version": 1,
+    }
+
+
+@pytest.mark.anyio
+async def test_create_post_fetches_user_once(
+    async_client, confirmed_user: dict, mocker
+):
+    token = user_security.create_access_token(confirmed_user["email"])
+    fetch_one = mocker.spy(user_security.database, "fetch_one")
+
+    response = await async_client.post(
+        "/post",
+        json={"body": "one user lookup"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 200
+    assert fetch_one.call_count == 1
+
+
+@pytest.mark.anyio
+async def test_confirm_email_invalidates_cached_user(
+    async_client, registered_user: dict
+):
+    email = registered_user["email"]
+    token = user_security.create_access_token(email)
+    assert not (await user_security.get_current_user(token)).confirmed
+
+    confirm_token = user_security.create_confirm_token(email)
+    response = await async_client.get(f"/confirm/{confirm_token}")
+
+    assert response.status_code == 200
+    assert (await user_security.get_current_user(token)).confirmed
+    assert await user_security.is_confirmed(email)
+
+
+@pytest.mark.anyio
+async def test_delete_account_invalidates_cached_user(
+    async_client, confirmed_user: dict
+):
+    token = user_security.create_access_token(confirmed_user["email"])
+    response = await async_client.delete(
+        "/delete", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        await user_security.get_current_user(token)
+    assert exc_info.value.status_code == 401
+
+
+def test_decode_token_caches_verified_claims(mocker):
+    token = user_security.create_access_token("cached@example.com")
+    user_security.token_claims_cache.clear()
+    decode = mocker.spy(user_security.jwt, "decode")
+    hits = user_security.token_claims_cache.hits
+
+    assert user_security.get_subject_token_type(token, "access") == (
+        "cached@example.com"
+    )
+    assert user_security.get_subject_token_type(token, "access") == (
+        "cached@example.com"
+    )
+
+    assert decode.call_count == 1
+    assert user_security.token_claims_cache.hits == hits + 1
+
+
+def test_cached_claims_expire_with_the_token(mocker):
+    token = user_security.create_access_token("expiring@example.com")
+    user_security.token_claims_cache.clear()
+    user_security.decode_token(token)
+
+    after_expiry = time.monotonic() + 31 * 60
+    mocker.patch("foodapp.services.cache.time.monotonic", return_value=after_expiry)
+    mocker.patch(
+        "foodapp.security.user_security.jwt.decode",
+        side_effect=jwt.ExpiredSignatureError,
+    )
+
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        user_security.decode_token(token)
+    assert exc_info.value.detail == "Token has expired"
+
+
+def test_invalid_tokens_are_not_cached():
+    user_security.token_claims_cache.clear()
+    with pytest.raises(user_security.HTTPException):
+        user_security.decode_token("not-a-token")
+
+    assert user_security.token_claims_cache.stats()["entries"] == 0
+
+
+@pytest.mark.anyio
+async def test_login_rehashes_password_with_old_parameters(
+    async_client, confirmed_user: dict
+):
+    old_parameters = password_hashing.current_parameters()._replace(time_cost=1)
+    old_hash = PasswordHasher(**old_parameters._asdict()).hash(
+        confirmed_user["password"]
+    )
+    await user_security.database.execute(
+        user_security.user_table.update()
+        .where(user_security.user_table.c.email == confirmed_user["email"])
+        .values(password=old_hash)
+    )
+
+    response = await async_client.post(
+        "/token",
+        json={"email": confirmed_user["email"], "password": confirmed_user["password"]},
+    )
+
+    assert response.status_code == 200
+    user = await user_security.get_user(confirmed_user["email"])
+    assert user.password != old_hash
+    assert not password_hashing.needs_rehash(user.password)
+    assert password_hashing.check_password(user.password, confirmed_user["password"])
+
+
+async def claims_token(email: str) -> str:
+    return user_security.create_access_token(
+        email, await user_security.get_user_identity(email)
+    )
+
+
+@pytest.mark.anyio
+async def test_access_token_carries_authorization_claims(confirmed_user: dict):
+    token = await claims_token(confirmed_user["email"])
+    claims = jwt.decode(
+        token, key=user_security.SECRET_KEY, algorithms=[user_security.ALGORITHM]
+    )
+
+    assert {
+        "sub": confirmed_user["email"],
+        "uid": confirmed_user["id"],
+        "confirmed": True,
+        "ver": 1,
+    }.items() <= claims.items()
+
+
+@pytest.mark.anyio
+async def test_create_post_with_claims_needs_no_user_query(
+    async_client, confirmed_user: dict, mocker
+):
+    token = await claims_token(confirmed_user["email"])
+    user_security.user_identity_cache.clear()
+    fetch_one = mocker.spy(user_security.database, "fetch_one")
+
+    response = await async_client.post(
+        "/post",
+        json={"body": "no user lookup"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["user_id"] == confirmed_user["id"]
+    fetch_one.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_confirm_email_makes_claims_stale(async_client, registered_user: dict):
+    email = registered_user["email"]
+    token = await claims_token(email)
+    assert not (await user_security.get_current_user(token)).confirmed
+
+    await async_client.get(f"/confirm/{user_security.create_confirm_token(email)}")
+
+    user = await user_security.get_current_user(token)
+    assert user.confirmed
+    assert user.token_version == 2
+
+
+@pytest.mark.anyio
+async def test_deleted_user_claims_are_rejected(async_client, confirmed_user: dict):
+    token = await claims_token(confirmed_user["email"])
+    response = await async_client.delete(
+        "/delete", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        await user_security.get_current_user(token)
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_deleted_user_claims_are_rejected_by_other_workers(
+    async_client, confirmed_user: dict
+):
+    token = await claims_token(confirmed_user["email"])
+    await async_client.delete("/delete", headers={"Authorization": f"Bearer {token}"})
+    # a worker that neither bumped the version nor made the revocation
+    user_security.bumped_token_versions.clear()
+    user_security.token_versions.clear()
+    user_security.revocation_list.clear()
+    await user_security.revocation_list.load()
+
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        await user_security.get_current_user(token)
+    assert exc_info.value.detail == "token has been revoked"
+
+
+@pytest.mark.anyio
+async def test_bumped_version_outlives_token_version_eviction(
+    async_client, confirmed_user: dict
+):
+    email = confirmed_user["email"]
+    token = await claims_token(email)
+
+    await user_security.bump_token_version(email)
+    user_security.token_versions.clear()
+
+    claims = user_security.get_token_claims(token, "access")
+    assert user_security.identity_from_claims(claims) is None
+
+
+@pytest.fixture()
+def signing_key_ring(mocker):
+    ring = KeyRing([generate_key(kid="current")])
+    mocker.patch.object(user_security, "key_ring", ring)
+    user_security.token_claims_cache.clear()
+    return ring
+
+
+@pytest.mark.anyio
+async def test_access_token_verifies_with_published_jwks(
+    async_client, signing_key_ring
+):
+    token = user_security.create_access_token("jwks@example.com")
+    response = await async_client.get("/.well-known/jwks.json")
+
+    assert response.status_code == 200
+    jwk_set = jwt.PyJWKSet.from_dict(response.json())
+    signing_key = jwk_set[jwt.get_unverified_header(token)["kid"]]
+    claims = jwt.decode(token, signing_key.key, algorithms=["EdDSA"])
+    assert claims["sub"] == "jwks@example.com"
+    assert user_security.get_subject_token_type(token, "access") == "jwks@example.com"
+
+
+def test_hmac_tokens_still_verify_with_key_ring(signing_key_ring):
+    token = jwt.encode(
+        {"sub": "old@example.com", "type": "access"},
+        user_security.SECRET_KEY,
+        user_security.ALGORITHM,
+    )
+    assert user_security.get_subject_token_type(token, "access") == "old@example.com"
+
+
+def test_hmac_access_tokens_rejected_once_turned_off(mocker, signing_key_ring):
+    mocker.patch.object(user_security, "ACCEPT_HMAC_ACCESS_TOKENS", False)
+    access_token = jwt.encode(
+        {"sub": "old@example.com", "type": "access"},
+        user_security.SECRET_KEY,
+        user_security.ALGORITHM,
+    )
+
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        user_security.get_subject_token_type(access_token, "access")
+    assert exc_info.value.detail == "invalid token"
+    confirm_token = user_security.create_confirm_token("old@example.com")
+    assert (
+        user_security.get_subject_token_type(confirm_token, "confirmation")
+        == "old@example.com"
+    )
+
+
+def test_tokens_from_retired_keys_are_rejected_after_overlap(signing_key_ring):
+    token = user_security.create_access_token("rotated@example.com")
+    signing_key_ring.overlap_seconds = 0
+    signing_key_ring.rotate(generate_key(kid="next"))
+    user_security.token_claims_cache.clear()
+
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        user_security.get_subject_token_type(token, "access")
+    assert exc_info.value.detail == "invalid token"
+
+
+def base64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def test_public_key_cannot_be_used_as_hmac_secret(signing_key_ring):
+    public_pem = signing_key_ring.signing_key.public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    header = base64url(json.dumps({"alg": "HS256", "kid": "current"}).encode())
+    payload = base64url(
+        json.dumps({"sub": "forged@example.com", "type": "access"}).encode()
+    )
+    signature = hmac.new(public_pem, f"{header}.{payload}".encode(), hashlib.sha256)
+    forged = f"{header}.{payload}.{base64url(signature.digest())}"
+
+    with pytest.raises(user_security.HTTPException) as exc_info:
+        user_security.get_subject_token_type(forged, "access")
+    assert exc_info.value.detail == "invalid token"
+
+
+def test_configure_password_hasher_uses_shared_parameters(mocker):
+    original = password_hashing.current_parameters()
+    mocker.patch.object(user_security.config, "ARGON2_TIME_COST", 2)
+    mocker.patch.object(user_security.config, "ARGON2_MEMORY_COST_KIB", 19456)
+    mocker.patch.object(user_security.config, "ARGON2_PARALLELISM", 1)
+    try:
+        parameters = user_security.configure_password_hasher()
+        assert parameters == password_hashing.Argon2Parameters(2, 19456, 1)
+        assert password_hashing.current_parameters() == parameters
+    finally:
+        password_hashing.use_parameters(original)
@@ -0,0 +1,86 @@
+"""
+tests for the expired token sweeper in foodapp.services.token_sweeper
+"""
+
+import datetime
+
+import pytest
+
+from foodapp.db.database import db_connection, password_reset_table, refreshtoken_table
+from foodapp.services.token_sweeper import TokenSweeper
+
+database = db_connection()
+
+
+async def insert_tokens(table, email: str, expiries: list[datetime.timedelta]):
+    now = datetime.datetime.now(tz=datetime.UTC)
+    await database.execute(
+        table.insert().values(
+            [
+                {
+                    "jti": f"{table.name}-{n}",
+                    "user_email": email,
+                    "hashed_token": f"{table.name}-digest-{n}",
+                    "expires_at": now + expiry,
+                }
+                for n, expiry in enumerate(expiries)
+            ]
+        )
+    )
+
+
+async def count_rows(table) -> int:
+    return len(await database.fetch_all(table.select()))
+
+
+@pytest.mark.anyio
+async def test_sweep_removes_only_expired_rows_in_batches(
+    registered_user: dict, mocker
+):
+    email = registered_user["email"]
+    expired, live = datetime.timedelta(minutes=-1), datetime.timedelta(minutes=5)
+    await insert_tokens(refreshtoken_table, email, [expired] * 5 + [live] * 2)
+    await insert_tokens(password_reset_table, email, [expired, live])
+    live_refresh = await count_rows(refreshtoken_table) - 5
+    sleep = mocker.patch("foodapp.services.token_sweeper.asyncio.sleep")
+    sweeper = TokenSweeper(
+        database, [refreshtoken_table, password_reset_table], batch_size=2
+    )
+
+    assert await sweeper.sweep() == 6
+
+    assert await count_rows(refreshtoken_table) == live_refresh
+    assert await count_rows(password_reset_table) == 1
+    assert sweeper.stats()["removed"] == {
+        "refreshtokens": 5,
+        "password_reset_tokens": 1,
+    }
+    # a pause after each full batch
+    assert sleep.call_count == 2
+    assert await sweeper.sweep() == 0
+
+
+@pytest.mark.anyio
+async def test_registered_refresh_token_has_expiry(registered_user: dict):
+    row = await database.fetch_one(
+        refreshtoken_table.select().where(
+            refreshtoken_table.c.user_email == registered_user["email"]
+        )
+    )
+    remaining = row.expires_at.replace(tzinfo=datetime.UTC) - datetime.datetime.now(
+        tz=datetime.UTC
+    )
+    assert datetime.timedelta(days=29) < remaining <= datetime.timedelta(days=30)
+
+
+@pytest.mark.anyio
+async def test_login_recreates_swept_refresh_token(async_client, confirmed_user: dict):
+    await database.execute(refreshtoken_table.delete())
+
+    response = await async_client.post(
+        "/login",
+        json={"email": confirmed_user["email"], "password": confirmed_user["password"]},
+    )
+
+    assert response.status_code == 200
+    assert await count_rows(refreshtoken_table) == 1